@@ -0,0 +1,44 @@
+#! /usr/bin/env python
+'''
+Benchmark memory use and query time of the array-backed ``MossNet`` against the previous NetworkX ``MultiDiGraph`` backend
+'''
+from mossnet import MossNet
+from synthetic import fake_links
+from networkx import MultiDiGraph
+from sys import argv
+from time import perf_counter
+from tracemalloc import get_traced_memory,start,stop
+
+def old_backend(links):
+    '''Build the previous backend: two parallel MultiDiGraph edges per link'''
+    g = MultiDiGraph()
+    for u in links:
+        for v in links[u]:
+            for f in links[u][v]:
+                left, right = links[u][v][f]; g.add_edge(u, v, attr_dict = {'files':f, 'left':left, 'right':right})
+    return g
+
+def old_queries(g):
+    pairs = [(u,v) for u in g.nodes for v in g.neighbors(u) if u < v]
+    pairs.sort(key=lambda x: len(g.get_edge_data(x[0],x[1])), reverse=True)
+    return sum(len(g.get_edge_data(u,v)) for u,v in pairs)
+
+def new_queries(net):
+    return sum(net.num_links(u,v) for u,v in net.traverse_pairs())
+
+def measure(func, *args):
+    start(); t = perf_counter(); out = func(*args); t = perf_counter()-t; mem = get_traced_memory()[0]; stop()
+    return out, t, mem
+
+if __name__ == "__main__":
+    num_students = int(argv[1]) if len(argv) > 1 else 300; num_problems = int(argv[2]) if len(argv) > 2 else 10; density = float(argv[3]) if len(argv) > 3 else 0.05
+    links = fake_links(num_students, num_problems, density)
+    g, t_old_build, mem_old = measure(old_backend, links)
+    net, t_new_build, mem_new = measure(MossNet, links)
+    n_old, t_old_query, _ = measure(old_queries, g)
+    n_new, t_new_query, _ = measure(new_queries, net)
+    if n_old != n_new:
+        raise RuntimeError("Backends disagree on the number of links")
+    print("%d students, %d problems, %d links" % (num_students, num_problems, net.num_edges()))
+    print("build:   MultiDiGraph %.3f s, %.1f MB; MossNet %.3f s, %.1f MB (HTML shared by both)" % (t_old_build, mem_old/1e6, t_new_build, mem_new/1e6))
+    print("queries: MultiDiGraph %.3f s; MossNet %.3f s (sorted traversal + num_links of every pair)" % (t_old_query, t_new_query))
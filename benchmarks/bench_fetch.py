@@ -0,0 +1,44 @@
+#! /usr/bin/env python
+'''
+Benchmark building against a synthetic MOSS site served locally with injected latency, transient errors (HTTP 503 and reset connections),
+and throttling (HTTP 429 beyond a number of concurrent requests), checking that every build still gives the same network as a fault-free one
+'''
+from mossnet import Metrics,build
+from synthetic import SyntheticMoss
+from argparse import ArgumentParser
+from sys import exit,stderr
+from time import perf_counter
+
+def links(net):
+    '''Return the links of ``net`` as a ``set`` (to compare networks)'''
+    return set(net.table.records())
+
+def run(site, name, threads, reference=None, **faults):
+    '''Build from ``site`` served with ``faults`` using ``threads`` threads, print the throughput, and return the network'''
+    server = site.serve(**faults); m = Metrics(trace=False)
+    try:
+        t = perf_counter(); net = build(server.urls, threads=threads, metrics=m); t = perf_counter()-t
+    finally:
+        server.shutdown(); server.server_close()
+    same = '' if reference is None else ('same network' if links(net) == links(reference) else 'DIFFERENT NETWORK')
+    stderr.write("%-28s %3d threads %8.3f s %9.1f matches/s  retries %5d  decreases %3d  faults %s  %s\n" % (name, threads, t, site.num_matches/t, m.counters.get('retries', 0), m.counters.get('concurrency_decreases', 0), server.faults, same))
+    return net, same != 'DIFFERENT NETWORK'
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-s', '--students', type=int, default=120, help="Number of students (enough that each report spans several reads, so a serial build downloads matches mid-stream)")
+    parser.add_argument('-n', '--problems', type=int, default=2, help="Number of problems (MOSS reports)")
+    parser.add_argument('-d', '--density', type=float, default=0.05, help="Probability that a pair of students is matched in a problem")
+    parser.add_argument('-l', '--latency', type=float, default=0.01, help="Seconds the server waits before answering each request")
+    parser.add_argument('-e', '--error_rate', type=float, default=0.05, help="Probability that a request fails transiently")
+    parser.add_argument('-c', '--capacity', type=int, default=4, help="Concurrent requests the server handles before throttling")
+    parser.add_argument('-t', '--threads', type=int, default=16, help="Threads of the throttled builds")
+    args = parser.parse_args()
+    site = SyntheticMoss(args.students, args.problems, args.density)
+    reference, _ = run(site, 'no faults', args.capacity, latency=args.latency)
+    ok = [run(site, 'serial', 1, reference, latency=args.latency)[1], # streams a report while downloading its matches from the same host
+          run(site, 'errors', args.capacity, reference, latency=args.latency, error_rate=args.error_rate)[1],
+          run(site, 'throttled (at capacity)', args.capacity, reference, latency=args.latency, capacity=args.capacity)[1],
+          run(site, 'throttled (over capacity)', args.threads, reference, latency=args.latency, capacity=args.capacity)[1],
+          run(site, 'throttled with errors', args.threads, reference, latency=args.latency, error_rate=args.error_rate, capacity=args.capacity)[1]]
+    exit(0 if all(ok) else 1)
@@ -0,0 +1,41 @@
+#! /usr/bin/env python
+'''
+Benchmark the startup cost of "import mossnet" (each run is a fresh interpreter) and check that heavy dependencies stay unloaded
+'''
+from statistics import median
+from subprocess import run
+from sys import argv,executable
+from time import perf_counter
+
+HEAVY = ['networkx', 'scipy', 'scipy.stats', 'seaborn', 'matplotlib', 'bs4', 'mossnet.fetch', 'http.client', 'urllib.request', 'concurrent.futures']
+
+def time_command(code, repeats):
+    '''Return the median wall time (in seconds) of running ``code`` in a fresh interpreter'''
+    times = list()
+    for _ in range(repeats):
+        start = perf_counter(); run([executable, '-c', code], check=True); times.append(perf_counter()-start)
+    return median(times)
+
+def loaded_modules(code):
+    '''Return the heavy modules that are loaded after running ``code`` in a fresh interpreter'''
+    out = run([executable, '-c', '%s\nimport sys\nprint(" ".join(m for m in %r if m in sys.modules))' % (code, HEAVY)], check=True, capture_output=True, text=True).stdout
+    return out.split()
+
+def slowest_imports(code, num=10):
+    '''Return the ``num`` slowest (cumulative microseconds, module) imports of running ``code``, according to ``python -X importtime``'''
+    err = run([executable, '-X', 'importtime', '-c', code], check=True, capture_output=True, text=True).stderr; times = list()
+    for line in err.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            times.append((int(parts[1]), parts[2].strip()))
+    return sorted(times, reverse=True)[:num]
+
+if __name__ == "__main__":
+    repeats = int(argv[1]) if len(argv) > 1 else 10
+    baseline = time_command('pass', repeats)
+    for code in ['import mossnet', 'import mossnet; mossnet.load', 'import numpy']:
+        t = time_command(code, repeats)
+        print("%s: %.1f ms (%.1f ms over an empty interpreter); heavy modules loaded: %s" % (code, 1000*t, 1000*(t-baseline), ', '.join(loaded_modules(code)) or 'none'))
+    print("Slowest imports of 'import mossnet' (cumulative):")
+    for us, module in slowest_imports('import mossnet'):
+        print("  %8.1f ms  %s" % (us/1000, module))
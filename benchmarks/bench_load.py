@@ -0,0 +1,43 @@
+#! /usr/bin/env python
+'''
+Benchmark creating a ``MossNet`` from a 3D dictionary (validated vs. trusted bulk construction) and loading saved networks
+(pickles of a 3D dictionary, as older versions saved, vs. the pickled link table vs. the indexed format)
+'''
+from mossnet import MossNet,load
+from synthetic import fake_links
+from os import close,remove
+from os.path import getsize
+from pickle import dump as pkldump
+from sys import argv
+from tempfile import mkstemp
+from time import perf_counter
+
+def save_dict(links, outfile):
+    '''Save the 3D dictionary of MOSS results ``links`` as a pickle (as older versions of MossNet saved)'''
+    f = open(outfile, 'wb'); pkldump(links, f); f.close()
+
+def best(func, *args, repeats=3, **kwargs):
+    '''Return the result of ``func`` and its fastest time (in seconds) over ``repeats`` runs'''
+    times = list()
+    for _ in range(repeats):
+        t = perf_counter(); out = func(*args, **kwargs); times.append(perf_counter()-t)
+    return out, min(times)
+
+if __name__ == "__main__":
+    num_students = int(argv[1]) if len(argv) > 1 else 400; num_problems = int(argv[2]) if len(argv) > 2 else 10; density = float(argv[3]) if len(argv) > 3 else 0.05
+    links = fake_links(num_students, num_problems, density)
+    net, t_plain = best(MossNet, links)
+    trusted, t_trusted = best(MossNet, links, trusted=True)
+    if set(net.iter_links()) != set(trusted.iter_links()):
+        raise RuntimeError("Validated and trusted construction disagree")
+    print("%d students, %d problems, %d links, %d HTML strings" % (num_students, num_problems, len(net.table.links), len(net.blobs)))
+    print("init:   validated %.3f s; trusted %.3f s (%.1fx)" % (t_plain, t_trusted, t_plain/t_trusted))
+    paths = list()
+    for name, suffix, save in [('3D dict', '.pkl', lambda net, path: save_dict(links, path)), ('pickle', '.pkl', MossNet.save), ('indexed', '.mossnet', MossNet.save)]:
+        fd, path = mkstemp(suffix=suffix); close(fd); paths.append(path); save(net, path)
+        loaded, t = best(load, path)
+        if set(loaded.iter_links()) != set(net.iter_links()):
+            raise RuntimeError("%s round trip changed the network" % name)
+        print("load:   %-10s %.3f s (%.1f MB)" % (name, t, getsize(path)/1e6))
+    for path in paths:
+        remove(path)
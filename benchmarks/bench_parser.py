@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+'''
+Benchmark the streaming MOSS report parser against the previous BeautifulSoup-based parser
+'''
+from mossnet.build import _parse_report
+from random import Random
+from sys import argv,stderr
+from time import perf_counter
+
+def fake_report(num_rows, seed=0):
+    '''Return the HTML of a fake MOSS report index page with ``num_rows`` rows'''
+    rng = Random(seed); rows = list()
+    for i in range(num_rows):
+        u, v = rng.sample(range(max(2, num_rows//10)), 2); url = 'http://moss.stanford.edu/results/0/123456789/match%d.html' % i
+        rows.append('<TR><TD><A HREF="%s">/tmp/submissions/s%d@ucsd.edu/P1.java (%d%%)</A>\n    <TD><A HREF="%s">/tmp/submissions/s%d@ucsd.edu/P1.java (%d%%)</A>\n<TD ALIGN=right>%d\n' % (url, u, rng.randint(1,99), url, v, rng.randint(1,99), rng.randint(1,500)))
+    return '<HTML>\n<HEAD>\n<TITLE>Moss Results</TITLE>\n</HEAD>\n<BODY>\nMoss Results<p>\n<HR>\n<TABLE>\n<TR><TH>File 1<TH>File 2<TH>Lines Matched\n%s</TABLE>\n<HR>\n</BODY>\n</HTML>\n' % ''.join(rows)
+
+def bs4_parse_report(html):
+    '''The previous BeautifulSoup-based parser (reference implementation)'''
+    from bs4 import BeautifulSoup
+    rows = list()
+    for row in list(BeautifulSoup(html, "lxml").find_all('tr')):
+        cols = row.find_all('td')
+        if len(cols) != 3:
+            continue
+        moss_url = cols[0].find_all('a', href=True)[0]['href']
+        curr_filename1,curr_filename2 = [cols[i].find_all('a', href=True)[0].text.split('/')[-1].split()[0].strip() for i in [0,1]]
+        email1,email2 = [cols[i].find_all('a', href=True)[0].text.split('/')[-2] for i in [0,1]]
+        percent1,percent2 = [int(cols[i].find_all('a', href=True)[0].text.split('(')[-1].split('%')[0]) for i in [0,1]]
+        rows.append((moss_url, email1, curr_filename1, percent1, email2, curr_filename2, percent2))
+    return rows
+
+def chunks(html, chunk_size=65536):
+    for i in range(0, len(html), chunk_size):
+        yield html[i:i+chunk_size]
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in argv[1:]] or [1000, 5000, 20000]
+    for num_rows in sizes:
+        html = fake_report(num_rows)
+        start = perf_counter(); new = list(_parse_report(chunks(html))); t_new = perf_counter()-start
+        try:
+            start = perf_counter(); old = bs4_parse_report(html); t_old = perf_counter()-start
+        except ImportError:
+            stderr.write("bs4/lxml not installed; only timing the streaming parser\n"); old = None
+        if old is not None and old != new:
+            raise RuntimeError("Parsers disagree on a report with %d rows" % num_rows)
+        if old is None:
+            print("%d rows: streaming %.3f s" % (num_rows, t_new))
+        else:
+            print("%d rows: streaming %.3f s, BeautifulSoup %.3f s (%.1fx faster)" % (num_rows, t_new, t_old, t_old/t_new))
@@ -0,0 +1,40 @@
+#! /usr/bin/env python
+'''
+Benchmark the peak memory and time of building in memory vs. spilling to disk (``build(spill=...)``) under a memory budget,
+checking that both give the same network
+'''
+from mossnet import build
+from synthetic import SyntheticMoss
+from argparse import ArgumentParser
+from os import remove
+from os.path import getsize
+from sys import exit,stderr
+from tempfile import mkstemp
+from time import perf_counter
+from tracemalloc import get_traced_memory,start,stop
+
+def run(urls, name, **kwargs):
+    '''Build from ``urls`` with ``kwargs``, print its time and peak (Python-allocated) memory, and return the network'''
+    start(); t = perf_counter(); net = build(urls, **kwargs); t = perf_counter()-t; peak = get_traced_memory()[1]; stop()
+    stderr.write("%-24s %8.3f s  peak %8.1f MB\n" % (name, t, peak/1e6))
+    return net
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-s', '--students', type=int, default=100, help="Number of students")
+    parser.add_argument('-n', '--problems', type=int, default=5, help="Number of problems (MOSS reports)")
+    parser.add_argument('-d', '--density', type=float, default=0.1, help="Probability that a pair of students is matched in a problem")
+    parser.add_argument('-z', '--snippet_size', type=int, default=10000, help="Characters of code per matched file")
+    parser.add_argument('-m', '--memory', type=int, default=4194304, help="Memory budget (bytes) of the spilled build")
+    parser.add_argument('-t', '--threads', type=int, default=8, help="Number of threads")
+    args = parser.parse_args()
+    site = SyntheticMoss(args.students, args.problems, args.density, snippet_size=args.snippet_size); server = site.serve()
+    fd, path = mkstemp(suffix='.mossnet')
+    try:
+        net = run(server.urls, 'in memory', threads=args.threads)
+        spilled = run(server.urls, 'spilled (%d MB budget)' % (args.memory >> 20), threads=args.threads, spill=path, spill_memory=args.memory)
+        same = set(net.iter_links(html=True)) == set(spilled.iter_links(html=True))
+        stderr.write("%d matches, %.1f MB file, %s\n" % (site.num_matches, getsize(path)/1e6, 'same network' if same else 'DIFFERENT NETWORK'))
+    finally:
+        server.shutdown(); server.server_close(); remove(path)
+    exit(0 if same else 1)
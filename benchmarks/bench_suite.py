@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+'''
+Benchmark every stage of MossNet (build, init, save/load, queries, and export) against a synthetic MOSS site served locally,
+and write the results as JSON (optionally comparing them against a previous run to catch regressions). Every build variant's network is
+checked against the threaded build's, and the suite fails if any differs
+'''
+from mossnet import MossNet,build,load
+from synthetic import SyntheticMoss
+from argparse import ArgumentParser
+from json import dump,load as jload
+from os.path import getsize
+from platform import platform,python_version
+from shutil import rmtree
+from sys import exit,stderr,stdout
+from tempfile import mkdtemp
+from time import perf_counter,strftime
+from tracemalloc import get_traced_memory,start,stop
+
+def measure(name, func, items, unit, memory=True, repeats=1):
+    '''Time ``func()`` (the fastest of ``repeats`` runs) and, if ``memory``, measure its peak traced memory in a separate run
+
+    Args:
+        ``name`` (``str``): The name of the stage
+
+        ``func`` (``function``): The stage (must be repeatable)
+
+        ``items`` (``int``): The number of items the stage processes (for throughput)
+
+        ``unit`` (``str``): What the items are (e.g. ``"links"``)
+
+        ``memory`` (``bool``): ``True`` to also measure peak memory (tracing slows the stage, so it's measured in a separate run)
+
+        ``repeats`` (``int``): The number of timed runs
+
+    Returns:
+        ``dict``: The result (``name``, ``seconds``, ``peak_bytes``, ``items``, ``unit``, ``items_per_second``)
+    '''
+    times = list(); peak = None
+    for _ in range(repeats):
+        t = perf_counter(); func(); times.append(perf_counter()-t)
+    t = min(times)
+    if memory:
+        start(); func(); peak = get_traced_memory()[1]; stop()
+    stderr.write("%-24s %8.3f s  %10s  %12.1f %s/s\n" % (name, t, '-' if peak is None else '%.1f MB' % (peak/1e6), items/max(t, 1e-9), unit))
+    return {'name':name, 'seconds':t, 'peak_bytes':peak, 'items':items, 'unit':unit, 'items_per_second':items/max(t, 1e-9)}
+
+def to_dict(net):
+    '''Return the 3D dictionary of MOSS results of ``net`` (the input of ``MossNet.__init__``)'''
+    out = {u:dict() for u in net.get_nodes()}
+    for u,v in net.traverse_pairs(None):
+        out[u][v] = net.get_pair(u, v); out[v][u] = net.get_pair(v, u)
+    return out
+
+def run(args):
+    '''Run every benchmark, and return the results as a JSON-serializable ``dict``'''
+    site = SyntheticMoss(args.students, args.problems, args.density, args.snippet_size, args.seed); server = site.serve(); urls = server.urls
+    tmp = mkdtemp(); results = list(); num_runs = [0]; mismatches = list()
+    def bench(name, func, items, unit):
+        results.append(measure(name, func, items, unit, memory=args.memory, repeats=args.repeats))
+    def bench_build(name, **kwargs): # time a build variant, then check its (last) network against the reference
+        built = [None]
+        def func():
+            built[0] = build(urls, **kwargs)
+        bench(name, func, site.num_matches, 'matches')
+        html = not kwargs.get('lazy', False) # lazily-built links have no HTML yet
+        if set(built[0].iter_links(html=html)) != set(net.iter_links(html=html)):
+            stderr.write("MISMATCH: %s built a different network than the reference (%d vs. %d links)\n" % (name, len(built[0].table.links), len(net.table.links))); mismatches.append(name)
+    def out_path(suffix): # stages run more than once, so each run gets its own output path
+        num_runs[0] += 1; return '%s/%d%s' % (tmp, num_runs[0], suffix)
+    try:
+        server.requests = 0; server.bytes_sent = 0; t = perf_counter(); net = build(urls, threads=args.threads); t = perf_counter()-t
+        stderr.write("%d matches, %d requests, %.1f MB downloaded in %.3f s\n" % (site.num_matches, server.requests, server.bytes_sent/1e6, t))
+        links = net.num_edges(); pairs = sum(1 for _ in net.traverse_pairs(None))
+        bench_build('build')
+        if args.threads != 1:
+            bench_build('build_threads_%d' % args.threads, threads=args.threads)
+        bench_build('build_lazy', lazy=True)
+        d = to_dict(net)
+        bench('init', lambda: MossNet(d), links, 'links')
+        del d
+        for style, suffix in [('pickle', '.pkl'), ('pickle', '.pkl.gz'), ('indexed', '.mossnet')]:
+            path = out_path(suffix); net.save(path, style=style); name = suffix.lstrip('.').replace('.', '_')
+            bench('save_%s' % name, lambda: net.save(out_path(suffix), style=style), links, 'links')
+            bench('load_%s' % name, lambda: load(path), links, 'links')
+            results[-1]['file_bytes'] = getsize(path)
+        bench('traverse_pairs', lambda: sum(1 for _ in net.traverse_pairs()), pairs, 'pairs')
+        bench('outlier_pairs', net.outlier_pairs, pairs, 'pairs')
+        bench('get_summary', net.get_summary, links, 'links')
+        for style, suffix in [('html', ''), ('dot', '.dot'), ('gexf', '.gexf'), ('graphml', '.graphml'), ('csv', '.csv')]:
+            bench('export_%s' % style, lambda: net.export(out_path(suffix), style=style), pairs, 'pairs')
+            if args.processes != 1 and style == 'html':
+                bench('export_html_processes_%d' % args.processes, lambda: net.export(out_path(suffix), style=style, processes=args.processes), pairs, 'pairs')
+    finally:
+        server.shutdown(); server.server_close(); rmtree(tmp)
+    config = {k:getattr(args, k) for k in ['students', 'problems', 'density', 'snippet_size', 'seed', 'threads', 'processes', 'repeats']}
+    return {'date':strftime('%Y-%m-%dT%H:%M:%S'), 'python':python_version(), 'platform':platform(), 'config':config, 'links':links, 'pairs':pairs, 'results':results, 'mismatches':mismatches}
+
+def compare(report, baseline, tolerance, min_seconds=0.01):
+    '''Return the ``(name, baseline seconds, seconds)`` of each stage that got more than ``tolerance`` (fraction) and ``min_seconds`` slower than in ``baseline``'''
+    old = {r['name']:r for r in baseline['results']}; slower = list()
+    if baseline['config'] != report['config']:
+        stderr.write("WARNING: Baseline was run with a different configuration: %s\n" % baseline['config'])
+    for r in report['results']:
+        if r['name'] in old and r['seconds'] > (1+tolerance)*old[r['name']]['seconds'] and r['seconds'] - old[r['name']]['seconds'] > min_seconds:
+            slower.append((r['name'], old[r['name']]['seconds'], r['seconds']))
+    return slower
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-s', '--students', type=int, default=200, help="Number of students")
+    parser.add_argument('-n', '--problems', type=int, default=5, help="Number of problems (MOSS reports)")
+    parser.add_argument('-d', '--density', type=float, default=0.05, help="Probability that a pair of students is matched in a problem")
+    parser.add_argument('--snippet_size', type=int, default=1000, help="Approximate characters of code per side of a match")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('-t', '--threads', type=int, default=8, help="Threads of the threaded build")
+    parser.add_argument('-p', '--processes', type=int, default=1, help="Processes of the parallel HTML export")
+    parser.add_argument('-r', '--repeats', type=int, default=3, help="Timed runs per stage (the fastest is reported)")
+    parser.add_argument('--no_memory', dest='memory', action='store_false', help="Don't measure peak memory (saves a traced run per stage)")
+    parser.add_argument('-o', '--output', default=None, help="Output JSON file (default: stdout)")
+    parser.add_argument('-c', '--compare', default=None, help="Baseline JSON file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Fraction by which a stage may be slower than the baseline")
+    parser.add_argument('--min_seconds', type=float, default=0.01, help="Slowdowns smaller than this many seconds are ignored as noise")
+    args = parser.parse_args()
+    report = run(args)
+    if args.output is None:
+        dump(report, stdout, indent=1); print()
+    else:
+        f = open(args.output, 'w'); dump(report, f, indent=1); f.close()
+    failed = (len(report['mismatches']) != 0)
+    if args.compare is not None:
+        slower = compare(report, jload(open(args.compare)), args.tolerance, args.min_seconds)
+        for name, old_t, new_t in slower:
+            stderr.write("REGRESSION: %s took %.3f s (baseline %.3f s, %+.0f%%)\n" % (name, new_t, old_t, 100*(new_t/old_t-1)))
+        failed = failed or len(slower) != 0
+    exit(1 if failed else 0)
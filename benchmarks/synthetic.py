@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+'''
+Generate synthetic MOSS result sites (index tables, framesets, and top/left/right frames) and serve them from a local HTTP server
+'''
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+from random import Random
+from sys import argv
+from threading import Lock,Thread
+from time import sleep
+
+INDEX_HTML = '<HTML>\n<HEAD>\n<TITLE>Moss Results</TITLE>\n</HEAD>\n<BODY>\nMoss Results<p>\n<HR>\n<TABLE>\n<TR><TH>File 1<TH>File 2<TH>Lines Matched\n%s</TABLE>\n<HR>\nAny errors encountered during this query are listed below.<p></BODY>\n</HTML>\n'
+ROW_HTML = '<TR><TD><A HREF="%s">/tmp/submissions/%s/%s (%d%%)</A>\n    <TD><A HREF="%s">/tmp/submissions/%s/%s (%d%%)</A>\n<TD ALIGN=right>%d\n'
+MATCH_HTML = '<HTML>\n<HEAD>\n<TITLE>Matches for /tmp/submissions/%s/%s and /tmp/submissions/%s/%s</TITLE>\n</HEAD>\n<FRAMESET ROWS="150,*">\n<FRAMESET COLS="1000,*">\n  <FRAME SRC="match%d-top.html" NAME="top" FRAMEBORDER=0>\n</FRAMESET>\n<FRAMESET COLS="50%%,50%%">\n  <FRAME SRC="match%d-0.html" NAME="0">\n  <FRAME SRC="match%d-1.html" NAME="1">\n</FRAMESET>\n</FRAMESET>\n</HTML>\n'
+TOP_HTML = '<HTML><HEAD><TITLE>Top</TITLE></HEAD><BODY BGCOLOR=white><CENTER><TABLE BORDER="1" CELLSPACING="0" BGCOLOR="#d0d0d0"><TR><TH><A HREF="match%d-0.html" TARGET="0">/tmp/submissions/%s/%s (%d%%)</A>\n<TH><IMG SRC="../../bitmaps/tm_0_%d.gif" BORDER="0" ALIGN=left>\n<TH><A HREF="match%d-1.html" TARGET="1">/tmp/submissions/%s/%s (%d%%)</A>\n</TABLE></CENTER></BODY></HTML>\n'
+SOURCE_HTML = '<HTML>\n<HEAD>\n<TITLE>/tmp/submissions/%s/%s</TITLE>\n</HEAD>\n<BODY BGCOLOR=white>\n<HR>\n/tmp/submissions/%s/%s<p><PRE>\n%s\n</PRE>\n</PRE>\n</BODY>\n</HTML>\n'
+SNIPPET_HTML = '<A NAME="%d"></A><FONT color = #FF0000><A HREF="match%d-%d.html#%d" TARGET="%d"><IMG SRC="../../bitmaps/tm_0_1.gif" ALT="other" BORDER="0" ALIGN=left></A>\n%s</FONT>'
+
+def fake_links(num_students, num_problems, density, snippet_size=200, seed=0):
+    '''Return a fake (symmetric) 3D dictionary of MOSS results, in which every match has distinct HTML'''
+    rng = Random(seed); links = {'s%d@ucsd.edu' % i:dict() for i in range(num_students)}
+    for p in range(num_problems):
+        fn = 'P%d.java' % p
+        for i in range(num_students):
+            for j in range(i+1, num_students):
+                if rng.random() < density:
+                    u = 's%d@ucsd.edu' % i; v = 's%d@ucsd.edu' % j; u_html = ('%s %s %s ' % (u, v, fn)) * (snippet_size//30); v_html = ('%s %s %s ' % (v, u, fn)) * (snippet_size//30)
+                    u_percent = rng.randint(1,99); v_percent = rng.randint(1,99)
+                    links[u].setdefault(v, dict())[(fn,fn)] = ((u_percent, u_html), (v_percent, v_html))
+                    links[v].setdefault(u, dict())[(fn,fn)] = ((v_percent, v_html), (u_percent, u_html))
+    return links
+
+class SyntheticMoss:
+    def __init__(self, num_students=100, num_problems=5, density=0.05, snippet_size=1000, seed=0):
+        '''Create a synthetic MOSS result site (one report per problem), held in memory
+
+        Args:
+            ``num_students`` (``int``): The number of students
+
+            ``num_problems`` (``int``): The number of problems (i.e., MOSS reports)
+
+            ``density`` (``float``): The probability that a given pair of students is matched in a given problem
+
+            ``snippet_size`` (``int``): The approximate number of characters of source code shown per side of each match
+
+            ``seed`` (``int``): The random seed
+
+        Returns:
+            ``SyntheticMoss``: A ``SyntheticMoss`` object
+        '''
+        self.num_students = num_students; self.num_problems = num_problems; self.density = density; self.snippet_size = snippet_size; self.seed = seed
+        self.pages = dict(); self.num_matches = 0 # key = path (relative to the site's root); value = page (with "{BASE}" in place of the site's URL)
+        rng = Random(seed); emails = ['s%d@ucsd.edu' % i for i in range(num_students)]
+        for p in range(num_problems):
+            fn = 'P%d.java' % p; rows = list()
+            for i in range(num_students):
+                for j in range(i+1, num_students):
+                    if rng.random() < density:
+                        rows.append((i, j) if rng.random() < 0.5 else (j, i))
+            rng.shuffle(rows); trs = list()
+            for m,(i,j) in enumerate(rows):
+                e1 = emails[i]; e2 = emails[j]; p1 = rng.randint(1,99); p2 = rng.randint(1,99); href = '{BASE}/results/%d/match%d.html' % (p, m)
+                trs.append(ROW_HTML % (href, e1, fn, p1, href, e2, fn, p2, rng.randint(5,500)))
+                self.pages['results/%d/match%d.html' % (p, m)] = MATCH_HTML % (e1, fn, e2, fn, m, m, m)
+                self.pages['results/%d/match%d-top.html' % (p, m)] = TOP_HTML % (m, e1, fn, p1, p1, m, e2, fn, p2)
+                for side,e in enumerate([e1, e2]):
+                    self.pages['results/%d/match%d-%d.html' % (p, m, side)] = SOURCE_HTML % (e, fn, e, fn, self._source(rng, e, m, side))
+            self.pages['results/%d/index.html' % p] = INDEX_HTML % ''.join(trs); self.num_matches += len(rows)
+
+    def _source(self, rng, email, m, side):
+        '''Return the body of a left/right frame: roughly ``snippet_size`` characters of code, split into highlighted blocks'''
+        lines = list(); size = 0
+        while size < self.snippet_size:
+            lines.append('    int x%d = %d; // %s\n' % (len(lines), rng.randint(0, 999), email)); size += len(lines[-1])
+        blocks = [''.join(lines[k:k+5]) for k in range(0, len(lines), 5)]
+        return ''.join(SNIPPET_HTML % (k, m, 1-side, k, 1-side, block) for k,block in enumerate(blocks))
+
+    def serve(self, host='127.0.0.1', port=0, latency=0., error_rate=0., capacity=None, seed=0):
+        '''Serve this site from a local (threaded, keep-alive) HTTP server running in a background thread, optionally injecting faults
+
+        Args:
+            ``host`` (``str``): The host to listen on
+
+            ``port`` (``int``): The port to listen on (0 to pick a free port)
+
+            ``latency`` (``float``): Seconds to wait before answering each request
+
+            ``error_rate`` (``float``): The probability that a request fails transiently (half with HTTP 503, half by resetting the connection)
+
+            ``capacity`` (``int``): The number of concurrent requests the server handles, beyond which it answers HTTP 429 (like a throttling server), or ``None`` for no limit
+
+            ``seed`` (``int``): The random seed of the injected errors
+
+        Returns:
+            ``SyntheticMossServer``: The running server (call ``shutdown()`` to stop it)
+        '''
+        server = SyntheticMossServer((host, port), self, latency=latency, error_rate=error_rate, capacity=capacity, seed=seed)
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'; disable_nagle_algorithm = True # keep-alive, without delayed-ACK stalls on small responses
+
+    def do_GET(self):
+        data = self.server.pages.get(self.path.split('?')[0].lstrip('/'), None)
+        if data is None:
+            self.send_error(404); return
+        fault = self.server.start_request()
+        try:
+            if fault == 'throttle':
+                self.send_error(429); return
+            if self.server.latency > 0:
+                sleep(self.server.latency)
+            if fault == 'error':
+                self.send_response(503); self.send_header('Retry-After', '0'); self.send_header('Content-Length', '0'); self.end_headers(); return
+            if fault == 'reset':
+                self.close_connection = True; return # close the connection without answering
+        finally:
+            self.server.end_request()
+        self.server.count(len(data))
+        self.send_response(200); self.send_header('Content-Type', 'text/html'); self.send_header('Content-Length', str(len(data))); self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class SyntheticMossServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, site, latency=0., error_rate=0., capacity=None, seed=0):
+        '''Create an HTTP server of a ``SyntheticMoss`` site, with every page encoded (and its "{BASE}" filled in) up front (see ``SyntheticMoss.serve``)'''
+        ThreadingHTTPServer.__init__(self, address, _Handler)
+        self.base = 'http://%s:%d' % self.server_address[:2]
+        self.pages = {path:page.replace('{BASE}', self.base).encode() for path,page in site.pages.items()}
+        self.urls = ['%s/results/%d/index.html' % (self.base, p) for p in range(site.num_problems)]
+        self.latency = latency; self.error_rate = error_rate; self.capacity = capacity; self.rng = Random(seed)
+        self.requests = 0; self.bytes_sent = 0; self.in_flight = 0; self.faults = {'throttle':0, 'error':0, 'reset':0}; self.lock = Lock()
+
+    def count(self, num_bytes):
+        with self.lock:
+            self.requests += 1; self.bytes_sent += num_bytes
+
+    def start_request(self):
+        '''Count a request in flight, and return the fault to inject into it (``"throttle"``, ``"error"``, ``"reset"``, or ``None``)'''
+        with self.lock:
+            self.in_flight += 1; fault = None
+            if self.capacity is not None and self.in_flight > self.capacity:
+                fault = 'throttle'
+            elif self.rng.random() < self.error_rate:
+                fault = ('error', 'reset')[self.rng.random() < 0.5]
+            if fault is not None:
+                self.faults[fault] += 1
+            return fault
+
+    def end_request(self):
+        with self.lock:
+            self.in_flight -= 1
+
+if __name__ == "__main__":
+    num_students = int(argv[1]) if len(argv) > 1 else 100; num_problems = int(argv[2]) if len(argv) > 2 else 5; density = float(argv[3]) if len(argv) > 3 else 0.05
+    server = SyntheticMossServer(('127.0.0.1', int(argv[4]) if len(argv) > 4 else 0), SyntheticMoss(num_students, num_problems, density))
+    print('\n'.join(server.urls), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
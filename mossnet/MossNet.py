@@ -1,77 +1,203 @@
 #! /usr/bin/env python
+from mossnet.blobs import BlobStore,MappedBlobStore
+from mossnet.cluster import Dendrogram
+from mossnet.export import LINK_WRITERS,WRITERS,export_graph,export_links,link_chunks,pair_counts
+from mossnet.metrics import NULL_METRICS
+from mossnet.similarity import SnippetIndex,similar_snippets
+from mossnet.table import LinkTable,NODE_STATS_DTYPE,NO_ID,merge_tables,table_from_dict,table_from_records,top_indices
+from array import array
 from gzip import open as gopen
+from io import SEEK_END
+from itertools import islice
 from math import log
-from networkx import MultiDiGraph
-from os import makedirs
-from os.path import isdir,isfile
+from numpy import arange,argmin,argsort,flatnonzero,int64,maximum,repeat,searchsorted
+from numpy import array as nparray
+from os import makedirs,replace
+from os.path import getsize,isdir,isfile,samefile
 from pickle import dump as pkldump
+from pickle import dumps as pkldumps
 from pickle import load as pklload
-from scipy.stats import binom
+from pickle import loads as pklloads
+from pickle import HIGHEST_PROTOCOL
+from struct import calcsize,pack,unpack
+from sys import modules
+from time import time
+from warnings import warn
+
+SAVE_FORMAT = 'MossNet'; SAVE_VERSION = 1; INDEXED_VERSION = 1
+INDEXED_MAGIC = b'MOSSNET\x01'; INDEXED_FOOTER = '<QQ8s' # index offset, index length, INDEXED_MAGIC
+CHUNK_SIZE = 10000 # number of summary rows rendered at a time
+EXPORT_CHUNK_PAIRS = 256 # maximum number of pair pages rendered per task of a parallel HTML export (each task is sent to a process with all its HTML)
+MIN_PARALLEL_PAIRS = 2000 # HTML exports of fewer pairs are rendered serially, as starting processes would cost more than it saves
+SNIPPETS_SUFFIX = '.snippets.npz' # a saved network's snippet index (see MossNet.snippet_index) is saved next to it, in outfile + SNIPPETS_SUFFIX
+LINK_HTML = '<table style="width:100%%" border="1"><tr><td colspan="2"><center><b>%s/%s --- %s/%s</b></center></td></tr><tr><td>%s (%d%%)</td><td>%s (%d%%)</td></tr><tr><td><pre>%s</pre></td><td><pre>%s</pre></td></tr></table>'
 
 class MossNet:
-    def __init__(self, moss_results_dict):
+    def __init__(self, moss_results_dict, fetcher=None, blobs=None, metrics=None, trusted=False):
         '''Create a ``MossNet`` object from a 3D dictionary of downloaded MOSS results
 
         Args:
             ``moss_results_dict`` (``dict``): A 3D dictionary of downloaded MOSS results
 
+            ``fetcher`` (``Fetcher``): The ``Fetcher`` used to download match HTML that wasn't downloaded when building (see ``build(lazy=True)``).
+            Its kept-alive connections stay open until its ``close`` is called
+
+            ``blobs`` (``BlobStore``): If given, the HTML in ``moss_results_dict`` is given as IDs of strings in ``blobs`` rather than as strings
+
+            ``metrics`` (``Metrics``): A ``Metrics`` object in which to record timings of building, saving, and exporting this ``MossNet`` object, or ``None`` to not record
+
+            ``trusted`` (``bool``): ``True`` if ``moss_results_dict`` is known to be a well-formed symmetric 3D dictionary (e.g. built by ``build``), so it's read
+            in bulk without being validated (see ``table_from_dict``), otherwise ``False``
+
         Returns:
             ``MossNet``: A ``MossNet`` object
         '''
-        if isinstance(moss_results_dict, MultiDiGraph):
-            self.graph = moss_results_dict; return
+        self.fetcher = fetcher; self._graph = None; self._snippets = None; self._dendrograms = dict(); self.metrics = NULL_METRICS if metrics is None else metrics
+        with self.metrics.stage('init') as stage:
+            self._init_table(moss_results_dict, blobs, trusted); stage.items = len(self.table.links)
+
+    def _init_table(self, moss_results_dict, blobs, trusted):
+        '''Set ``self.table`` and ``self.blobs`` from the input of ``__init__``'''
+        if isinstance(moss_results_dict, LinkTable):
+            if blobs is None:
+                raise TypeError("blobs must be given when creating a MossNet from a LinkTable")
+            self.table = moss_results_dict; self.blobs = blobs; return
         if isinstance(moss_results_dict, str):
             try:
-                if moss_results_dict.lower().endswith('.gz'):
-                    moss_results_dict = load(gopen(moss_results_dict))
-                else:
-                    moss_results_dict = load(open(moss_results_dict,'rb'))
+                loaded = load(moss_results_dict, metrics=self.metrics)
             except:
                 raise ValueError("Unable to load dictionary: %s" % moss_results_dict)
+            self.table = loaded.table; self.blobs = loaded.blobs; self._snippets = loaded._snippets; return
+        if blobs is None:
+            self.blobs = BlobStore(); intern = self.blobs.add
+        else:
+            self.blobs = blobs; intern = lambda blob_id: blob_id
+        if trusted and isinstance(moss_results_dict, dict):
+            self.table = table_from_dict(moss_results_dict, intern=(None if blobs is not None else intern)); return
+        nx = modules.get('networkx', None) # networkx is only imported when it's needed, so if it isn't loaded, this can't be a graph
+        if nx is not None and isinstance(moss_results_dict, nx.MultiDiGraph):
+            records = ((u, v, d['attr_dict']['files'][0], d['attr_dict']['files'][1], d['attr_dict']['left'][0], intern(d['attr_dict']['left'][1]), d['attr_dict']['right'][0], intern(d['attr_dict']['right'][1]), d['attr_dict'].get('source', None)) for u,v,d in moss_results_dict.edges(data=True))
+            self.table = table_from_records(records, nodes=moss_results_dict.nodes); return
         if not isinstance(moss_results_dict, dict):
             raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
-        self.graph = MultiDiGraph()
-        for u in moss_results_dict:
-            u_edges = moss_results_dict[u]
-            if not isinstance(u_edges, dict):
-                raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
-            for v in u_edges:
-                u_v_links = u_edges[v]
-                if not isinstance(u_edges[v], dict):
-                    raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
-                for f in u_v_links:
-                    try:
-                        left, right = u_v_links[f]
-                    except:
-                        raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
-                    self.graph.add_edge(u, v, attr_dict = {'files':f, 'left':left, 'right':right})
+        self.table = table_from_records(_dict_records(moss_results_dict, intern), nodes=moss_results_dict)
+
+    @property
+    def graph(self):
+        '''A NetworkX ``MultiDiGraph`` equivalent to this ``MossNet`` object (built on first use; see ``get_networkx``)'''
+        if self._graph is None:
+            self._graph = self.get_networkx()
+        return self._graph
 
-    def save(self, outfile):
-        '''Save this ``MossNet`` object as a 3D dictionary of MOSS results
+    def save(self, outfile, style=None):
+        '''Save this ``MossNet`` object (each distinct HTML string is saved once)
 
         Args:
             ``outfile`` (``str``): The desired output file's path
+
+            ``style`` (``str``): The file format
+
+            * ``None`` to choose based on the extension of ``outfile`` (``"indexed"`` if it ends with ``.mossnet``, otherwise ``"pickle"``)
+
+            * ``"pickle"`` to save as a (gzip-compressed if ``outfile`` ends with ``.gz``) pickle of the link arrays, in the order ``load`` rebuilds them in
+
+            * ``"indexed"`` to save as a compact index followed by a memory-mappable section of HTML, which ``load`` opens without reading any HTML.
+              If this ``MossNet`` was loaded from ``outfile`` (and then e.g. updated by ``build(base=...)``), only HTML added since is written
+
+        If this ``MossNet`` has a snippet index (see ``snippet_index``), it's saved too, in ``outfile`` + ``SNIPPETS_SUFFIX``
         '''
-        out = dict()
-        for u in self.graph.nodes:
-            u_edges = dict(); out[u] = u_edges
-            for v in self.graph.neighbors(u):
-                u_v_links = dict(); u_edges[v] = u_v_links; u_v_edge_data = self.graph.get_edge_data(u,v)
-                for k in u_v_edge_data:
-                    edge = u_v_edge_data[k]['attr_dict']; u_v_links[edge['files']] = (edge['left'], edge['right'])
+        if style is None:
+            style = {True:'indexed', False:'pickle'}[outfile.lower().endswith('.mossnet')]
+        if style not in {'pickle', 'indexed'}:
+            raise ValueError("Invalid save style: %s" % style)
+        with self.metrics.stage('save_%s' % style) as stage:
+            if style == 'indexed':
+                self._save_indexed(outfile)
+            else:
+                self._save_pickle(outfile)
+            if self._snippets is not None:
+                self._snippets.save(outfile + SNIPPETS_SUFFIX)
+            stage.items = len(self.table.links)
+
+    def _save_pickle(self, outfile):
+        '''Save this ``MossNet`` object as a pickled ``(SAVE_FORMAT, SAVE_VERSION, HTML strings, link table)`` tuple, where the link table is a ``dict`` of the
+        ``LinkTable`` arrays (already sorted, so ``load`` rebuilds the table without sorting or validating) and the HTML digests (so they aren't recomputed)'''
+        t = self.table; b = self.blobs
+        out = {'nodes':t.nodes, 'files':t.files, 'urls':t.urls, 'pair_u':t.pair_u, 'pair_v':t.pair_v, 'offsets':t.offsets, 'links':t.links, 'digests':b''.join(b.digest(i) for i in range(len(b)))}
         if outfile.lower().endswith('.gz'):
             f = gopen(outfile, mode='wb', compresslevel=9)
         else:
             f = open(outfile, 'wb')
-        pkldump(out, f); f.close()
+        pkldump((SAVE_FORMAT, SAVE_VERSION, [b.get(i) for i in range(len(b))], out), f, protocol=HIGHEST_PROTOCOL); f.close()
+
+    def _save_indexed(self, outfile):
+        '''Save this ``MossNet`` object in the indexed format: ``MAGIC``, the HTML section(s), the index, and a footer holding the index's offset and length'''
+        b = self.blobs
+        if isinstance(b, MappedBlobStore) and isfile(outfile) and samefile(b.path, outfile) and getsize(outfile) == b.size:
+            self._append_indexed(outfile); return
+        tmp = '%s.tmp' % outfile # this MossNet may be memory-mapped from outfile, so don't overwrite it in place
+        f = open(tmp, 'wb'); f.write(INDEXED_MAGIC)
+        offsets = array('Q', [0]); digests = list()
+        for i in range(len(b)):
+            data = b.get(i).encode(); f.write(data); offsets.append(offsets[-1] + len(data)); digests.append(b.digest(i))
+        _write_index(f, self.table, [(len(INDEXED_MAGIC), offsets)], b''.join(digests)); f.close()
+        replace(tmp, outfile)
+
+    def _append_indexed(self, outfile):
+        '''Append the HTML that isn't yet in ``outfile`` (which this ``MossNet``'s HTML is memory-mapped from) as a new section, followed by a new index and footer.
+        The HTML already in the file isn't rewritten (the old index is just left unused; saving to another path writes a compact copy)'''
+        b = self.blobs; f = open(outfile, 'ab'); start = f.tell()
+        try:
+            offsets = array('Q', [0])
+            for i in range(b.num_mapped, len(b)):
+                data = b.get(i).encode(); f.write(data); offsets.append(offsets[-1] + len(data))
+            _write_index(f, self.table, b.sections + ([(start, offsets)] if len(offsets) > 1 else []), b.mapped_digests + b''.join(b.digests))
+        except:
+            f.truncate(start); f.close(); raise # restore the previous footer
+        f.close(); b.extend(start, offsets)
 
     def __add__(self, o):
         if not isinstance(o, MossNet):
             raise TypeError("unsupported operand type(s) for +: 'MossNet' and '%s'" % type(o).__name__)
-        g = MultiDiGraph()
-        g.add_edges_from(list(self.graph.edges(data=True)) + list(o.graph.edges(data=True)))
-        g.add_nodes_from(list(self.graph.nodes(data=True)) + list(o.graph.nodes(data=True)))
-        return MossNet(g)
+        return merge(self, o)
+
+    def __iadd__(self, o):
+        if not isinstance(o, MossNet):
+            raise TypeError("unsupported operand type(s) for +=: 'MossNet' and '%s'" % type(o).__name__)
+        with self.metrics.stage('merge'):
+            merged = merge(self, o)
+        self.table = merged.table; self.blobs = merged.blobs; self._graph = None
+        return self
+
+    def _extend(self, table):
+        '''Add the links of a ``LinkTable`` whose blob IDs are IDs in this ``MossNet``'s ``BlobStore`` (if a link is in both, the new one is kept)
+
+        Returns:
+            ``int``: The number of links that were already in this ``MossNet``
+        '''
+        identity = arange(len(self.blobs), dtype=int64); had_stats = (self.table._node_stats is not None)
+        self.table, num_duplicates = merge_tables([self.table, table], [identity, identity]); self._graph = None
+        if had_stats: # keep the per-node statistics of a network that uses them up to date
+            self.table.node_stats()
+        return num_duplicates
+
+    def _download_pair(self, u, v):
+        '''Download the match HTML of links between ``u`` and ``v`` that were built lazily'''
+        i = self.table.find(u, v)
+        if i is None:
+            return
+        links = self.table.links
+        for l in range(self.table.offsets[i], self.table.offsets[i+1]):
+            if links['source'][l] == NO_ID or (links['u_blob'][l] != NO_ID and links['v_blob'][l] != NO_ID):
+                continue
+            from mossnet.build import _fetch_match
+            if self.fetcher is None:
+                from mossnet.fetch import Fetcher
+                self.fetcher = Fetcher(metrics=self.metrics)
+            left_percent, left_html, right_percent, right_html = _fetch_match(self.fetcher, self.table.urls[links['source'][l]], u, v)
+            if links['side'][l] == 1:
+                left_html, right_html = right_html, left_html
+            links['u_blob'][l] = self.blobs.add(left_html); links['v_blob'][l] = self.blobs.add(right_html); self._graph = None
 
     def get_networkx(self):
         '''Return a NetworkX ``MultiDiGraph`` equivalent to this ``MossNet`` object
@@ -79,7 +205,17 @@ class MossNet:
         Returns:
             ``MultiDiGraph``: A NetworkX ``DiGraph`` equivalent to this ``MossNet`` object
         '''
-        return self.graph.copy()
+        from networkx import MultiDiGraph
+        g = MultiDiGraph(); g.add_nodes_from(self.table.nodes)
+        for u, v, u_fn, v_fn, u_percent, u_blob, v_percent, v_blob, source in self.table.records():
+            u_html = self.blobs.get(u_blob); v_html = self.blobs.get(v_blob)
+            if source is None:
+                g.add_edge(u, v, attr_dict = {'files':(u_fn,v_fn), 'left':(u_percent,u_html), 'right':(v_percent,v_html)})
+                g.add_edge(v, u, attr_dict = {'files':(v_fn,u_fn), 'left':(v_percent,v_html), 'right':(u_percent,u_html)})
+            else:
+                g.add_edge(u, v, attr_dict = {'files':(u_fn,v_fn), 'left':(u_percent,u_html), 'right':(v_percent,v_html), 'source':source})
+                g.add_edge(v, u, attr_dict = {'files':(v_fn,u_fn), 'left':(v_percent,v_html), 'right':(u_percent,u_html), 'source':(source[0], 1-source[1])})
+        return g
 
     def get_nodes(self):
         '''Returns a ``set`` of node labels in this ``MossNet`` object
@@ -87,7 +223,7 @@ class MossNet:
         Returns:
             ``set``: The node labels in this ``MossNet`` object
         '''
-        return set(self.graph.nodes)
+        return set(self.table.nodes)
 
     def get_pair(self, u, v, style='tuples'):
         '''Returns the links between nodes ``u`` and ``v``
@@ -113,23 +249,33 @@ class MossNet:
         if u == v:
             raise ValueError("u and v cannot be equal: %s" % u)
         for node in [u,v]:
-            if not self.graph.has_node(node):
+            if node not in self.table.node_index:
                 raise ValueError("Nonexistant node: %s" % node)
-        links = self.graph.get_edge_data(u,v)
+        links = self._pair_links(u, v)
+        if style == 'html':
+            return _pair_html(u, v, links)
         out = dict()
-        for k in sorted(links.keys(), key=lambda x: links[x]['attr_dict']['files']):
-            d = links[k]['attr_dict']
-            u_fn, v_fn = d['files']
-            u_percent, u_html = d['left']
-            v_percent, v_html = d['right']
+        for u_fn, v_fn, u_percent, u_html, v_percent, v_html in links:
             if style == 'tuples':
                 out[(u_fn, v_fn)] = ((u_percent, u_html), (v_percent, v_html))
-            elif style in {'html', 'htmls'}:
-                out[(u_fn, v_fn)] = '<html><table style="width:100%%" border="1"><tr><td colspan="2"><center><b>%s/%s --- %s/%s</b></center></td></tr><tr><td>%s (%d%%)</td><td>%s (%d%%)</td></tr><tr><td><pre>%s</pre></td><td><pre>%s</pre></td></tr></table></html>' % (u, u_fn, v, v_fn, u, u_percent, v, v_percent, u_html, v_html)
-        if style == 'html':
-            out = '<html>' + '<br>'.join(out[fns].replace('<html>','').replace('</html>','') for fns in sorted(out.keys())) + '</html>'
+            elif style == 'htmls':
+                out[(u_fn, v_fn)] = '<html>%s</html>' % (LINK_HTML % (u, u_fn, v, v_fn, u, u_percent, v, v_percent, u_html, v_html))
         return out
 
+    def _pair_links(self, u, v):
+        '''Return the links between ``u`` and ``v`` as a sorted list of ``(u_fn, v_fn, u_percent, u_html, v_percent, v_html)`` tuples (downloading lazily-built HTML)'''
+        self._download_pair(u, v)
+        i = self.table.find(u, v); links = list()
+        if i is None:
+            return links
+        files = self.table.files
+        for u_file, v_file, u_percent, v_percent, u_blob, v_blob, source, side in self.table.links[self.table.offsets[i]:self.table.offsets[i+1]].tolist():
+            if v < u: # pairs are stored with the smaller label first
+                u_file, v_file, u_percent, v_percent, u_blob, v_blob = v_file, u_file, v_percent, u_percent, v_blob, u_blob
+            links.append((files[u_file], files[v_file], u_percent, (None if u_blob == NO_ID else u_blob), v_percent, (None if v_blob == NO_ID else v_blob)))
+        links.sort()
+        return [(u_fn, v_fn, u_percent, self.blobs.get(u_blob), v_percent, self.blobs.get(v_blob)) for u_fn, v_fn, u_percent, u_blob, v_percent, v_blob in links]
+
     def get_summary(self, style='html'):
         '''Returns a summary of this ``MossNet``
 
@@ -141,17 +287,18 @@ class MossNet:
         '''
         if style not in {'html'}:
             raise ValueError("Invalid summary style: %s" % style)
-        matches = list() # list of (u_path, u_percent, v_path, v_percent) tuples
-        for u,v in self.traverse_pairs(order=None):
-            links = self.graph.get_edge_data(u,v)
-            for k in links:
-                d = links[k]['attr_dict']
-                u_fn, v_fn = d['files']
-                u_percent, u_html = d['left']
-                v_percent, v_html = d['right']
-                matches.append(('%s/%s' % (u,u_fn), u_percent, '%s/%s' % (v,v_fn), v_percent))
-        matches.sort(reverse=True, key=lambda x: max(x[1],x[3]))
-        return '<html><table style="width:100%%" border="1">%s</table></html>' % ''.join(('<tr><td>%s (%d%%)</td><td>%s (%d%%)</td></tr>' % tup) for tup in matches)
+        return ''.join(self._summary_chunks())
+
+    def _summary_chunks(self, chunk_size=CHUNK_SIZE):
+        '''Iterate over the HTML summary in pieces of (at most) ``chunk_size`` rows, in descending order of max percent'''
+        t = self.table; nodes = t.nodes; files = t.files; links = t.links
+        pair_of_link = repeat(arange(t.num_pairs()), t.counts)
+        order = argsort(-maximum(links['u_percent'], links['v_percent']), kind='stable')
+        yield '<html><table style="width:100%" border="1">'
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start:start+chunk_size]; chunk_pairs = pair_of_link[chunk]; chunk_links = links[chunk]
+            yield ''.join(('<tr><td>%s/%s (%d%%)</td><td>%s/%s (%d%%)</td></tr>' % (nodes[u], files[u_file], u_percent, nodes[v], files[v_file], v_percent)) for u, v, u_file, v_file, u_percent, v_percent in zip(t.pair_u[chunk_pairs].tolist(), t.pair_v[chunk_pairs].tolist(), chunk_links['u_file'].tolist(), chunk_links['v_file'].tolist(), chunk_links['u_percent'].tolist(), chunk_links['v_percent'].tolist()))
+        yield '</table></html>'
 
     def num_links(self, u, v):
         '''Returns the number of links between ``u`` and ``v``
@@ -165,9 +312,12 @@ class MossNet:
             ``int``: The number of links between ``u`` and ``v``
         '''
         for node in [u,v]:
-            if not self.graph.has_node(node):
+            if node not in self.table.node_index:
                 raise ValueError("Nonexistant node: %s" % node)
-        return len(self.graph.get_edge_data(u,v))
+        i = self.table.find(u, v)
+        if i is None:
+            return 0
+        return int(self.table.counts[i])
 
     def num_nodes(self):
         '''Returns the number of nodes in this ``MossNet`` object
@@ -175,7 +325,7 @@ class MossNet:
         Returns:
             ``int``: The number of nodes in this ``MossNet`` object
         '''
-        return self.graph.number_of_nodes()
+        return len(self.table.nodes)
 
     def num_edges(self):
         '''Returns the number of (undirected) edges in this ``MossNet`` object (including parallel edges)
@@ -183,7 +333,43 @@ class MossNet:
         Returns:
             ``int``: The number of (undirected) edges in this ``MossNet`` object (including parallel edges)
         '''
-        return int(self.graph.number_of_edges()/2)
+        return len(self.table.links)
+
+    def node_stats(self, u):
+        '''Returns the statistics of node ``u`` (from the per-node statistics table, which is computed for all nodes at once and cached)
+
+        Args:
+            ``u`` (``str``): A node label
+
+        Returns:
+            ``dict``: The ``degree`` (number of other nodes ``u`` is linked to), ``links`` (number of links), ``max_percent`` and ``mean_percent``
+            (of ``u``'s percents over its links), and ``files`` (number of distinct filenames of ``u``'s files in its links) of ``u``
+        '''
+        if u not in self.table.node_index:
+            raise ValueError("Nonexistant node: %s" % u)
+        return dict(zip(NODE_STATS_DTYPE.names, self.table.node_stats()[self.table.node_index[u]].tolist()))
+
+    def rank_nodes(self, by='links', k=None):
+        '''Rank nodes by one of their statistics (see ``node_stats``), selecting the top ``k`` in linear time rather than sorting every node
+
+        Args:
+            ``by`` (``str``): The statistic (``"degree"``, ``"links"``, ``"max_percent"``, ``"mean_percent"``, or ``"files"``)
+
+            ``k`` (``int``): The number of nodes, or ``None`` for all nodes
+
+        Returns:
+            ``list`` of ``tuple``: The ``(value, u)`` of each node, in decreasing order of ``value`` (ties in node order)
+        '''
+        if by not in NODE_STATS_DTYPE.names:
+            raise ValueError("Invalid node statistic: %s" % by)
+        if k is None:
+            k = len(self.table.nodes)
+        if not isinstance(k, int):
+            raise TypeError("'k' must be an 'int', but you provided a '%s'" % type(k).__name__)
+        if k < 0:
+            raise ValueError("'k' must be non-negative, but yours was %d" % k)
+        values = self.table.node_stats()[by]; top = top_indices(values, k); nodes = self.table.nodes
+        return list(zip(values[top].tolist(), [nodes[u] for u in top.tolist()]))
 
     def outlier_pairs(self):
         '''Predict which student pairs are outliers (i.e., too many problem similarities).
@@ -193,27 +379,101 @@ class MossNet:
         Returns:
             ``list`` of ``tuple``: The student pairs expected to be outliers (in decreasing order of significance)
         '''
-        links = dict() # key = number of links; value = set of student pairs that have that number of links
-        for u,v in self.traverse_pairs():
-            n = self.num_links(u,v)
-            if n not in links:
-                links[n] = set()
-            links[n].add((u,v))
-        mult = list(); min_links = min(len(s) for s in links.values()); max_links = max(len(s) for s in links.values())
-        for i in range(min_links, max_links):
-            if i not in links or i+1 not in links or len(links[i+1]) > len(links[i]):
-                break
-            mult.append(float(len(links[i]))/len(links[i+1]))
-        B = sum(mult)/len(mult)
-        A = len(links[min_links]) * (B**min_links)
-        n_cutoff = log(A)/log(B)
-        out = list()
-        for n in sorted(links.keys(), reverse=True):
-            if n < n_cutoff:
-                break
-            for u,v in links[n]:
-                out.append((n,u,v))
-        return out
+        A_B = self._fit_decay()
+        if A_B is None: # no decreasing run in the histogram, so there's nothing to call an outlier
+            return list()
+        A, B = A_B; n_cutoff = log(A)/log(B)
+        us, vs, counts = self._pair_counts('descending')
+        num_out = int((self.table.counts >= n_cutoff).sum()) # pairs are sorted by number of links, so the outliers are a prefix
+        return list(zip(counts[:num_out], us[:num_out], vs[:num_out]))
+
+    def _fit_decay(self):
+        '''Fit y = A/(B^x) to the histogram of number of links per pair: B is the mean ratio of consecutive histogram counts
+        over the run (starting at the smallest number of links) in which counts decrease, and A makes the model exact at that smallest number
+
+        Returns:
+            ``tuple``: The ``(A, B)`` of the model, or ``None`` if it can't be fit (``B`` would not exceed 1)
+        '''
+        hist = self.table.histogram()
+        if len(hist) == 0:
+            return None
+        hist = hist.astype(float); min_links = int(flatnonzero(hist)[0]) if hist.any() else 0
+        if min_links == 0:
+            return None
+        h = hist[min_links:]
+        valid = (h[:-1] > 0) & (h[1:] > 0) & (h[1:] <= h[:-1])
+        run = len(valid) if valid.all() else int(argmin(valid))
+        if run == 0:
+            return None
+        B = float((h[:run]/h[1:run+1]).mean())
+        if B <= 1:
+            return None
+        return float(h[0] * (B**min_links)), B
+
+    def pair_scores(self, trials=None):
+        '''Score every student pair by the binomial probability of having at least as many links as it does by chance.
+        Each of the ``trials`` problems is assumed to link any two students independently with the same probability,
+        estimated as (number of links) / (number of student pairs * ``trials``)
+
+        Args:
+            ``trials`` (``int``): The number of problems, or ``None`` to use the number of distinct filenames (or the largest number of links of a pair, if larger)
+
+        Returns:
+            ``list`` of ``tuple``: The ``(p_value, num_links, u, v)`` of each pair (in increasing order of ``p_value``, i.e., decreasing significance)
+        '''
+        from scipy.stats import binom
+        t = self.table
+        if trials is None:
+            trials = max(len(t.files), int(t.counts.max()) if t.num_pairs() != 0 else 0)
+        if not isinstance(trials, int):
+            raise TypeError("'trials' must be an 'int', but you provided a '%s'" % type(trials).__name__)
+        if t.num_pairs() == 0:
+            return list()
+        if trials < t.counts.max():
+            raise ValueError("'trials' must be at least the largest number of links of a pair (%d), but yours was %d" % (t.counts.max(), trials))
+        num_possible_pairs = len(t.nodes)*(len(t.nodes)-1)/2
+        p = len(t.links) / (num_possible_pairs*trials)
+        p_values = binom.sf(t.counts-1, trials, p) # P(X >= num_links), computed for all pairs in one call
+        order = argsort(p_values, kind='stable')
+        return list(zip(p_values[order].tolist(), t.counts[order].tolist(), [t.nodes[u] for u in t.pair_u[order].tolist()], [t.nodes[v] for v in t.pair_v[order].tolist()]))
+
+    def dendrogram(self, min_percent=0):
+        '''Return the ``Dendrogram`` of this ``MossNet``: its clusters of students at every threshold of number of links, computed in a single sweep
+        (and cached, so clustering at many thresholds costs one sort and one union-find pass)
+
+        Args:
+            ``min_percent`` (``int``): Only count links in which either file's percent similarity is at least ``min_percent``
+
+        Returns:
+            ``Dendrogram``: The ``Dendrogram``
+        '''
+        if not isinstance(min_percent, int):
+            raise TypeError("'min_percent' must be an 'int', but you provided a '%s'" % type(min_percent).__name__)
+        d = self._dendrograms.get(min_percent, None)
+        if d is None or d.table is not self.table: # the table is replaced (not modified) when links are added
+            with self.metrics.stage('dendrogram') as stage:
+                d = Dendrogram(self.table, min_percent=min_percent); stage.items = self.table.num_pairs()
+            self._dendrograms[min_percent] = d
+        return d
+
+    def clusters(self, min_links=1, min_size=2, min_percent=0):
+        '''Return the groups of students connected by pairs with at least ``min_links`` links (i.e., the connected components of those pairs)
+
+        Args:
+            ``min_links`` (``int``): The minimum number of (counted) links of a pair
+
+            ``min_size`` (``int``): The minimum number of students of a group
+
+            ``min_percent`` (``int``): Only count links in which either file's percent similarity is at least ``min_percent``
+
+        Returns:
+            ``list`` of ``list``: The students of each group (in decreasing order of size)
+        '''
+        if not isinstance(min_links, int):
+            raise TypeError("'min_links' must be an 'int', but you provided a '%s'" % type(min_links).__name__)
+        if not isinstance(min_size, int):
+            raise TypeError("'min_size' must be an 'int', but you provided a '%s'" % type(min_size).__name__)
+        return self.dendrogram(min_percent).clusters(max(min_links, 1), min_size=min_size)
 
     def traverse_pairs(self, order='descending'):
         '''Iterate over student pairs
@@ -229,16 +489,191 @@ class MossNet:
         '''
         if order not in {None, 'None', 'none', 'ascending', 'descending'}:
             raise ValueError("Invalid order: %s" % order)
-        nodes = list(self.graph.nodes)
-        pairs = [(u,v) for u in self.graph.nodes for v in self.graph.neighbors(u) if u < v]
-        if order == 'ascending':
-            pairs.sort(key=lambda x: len(self.graph.get_edge_data(x[0],x[1])))
-        elif order == 'descending':
-            pairs.sort(key=lambda x: len(self.graph.get_edge_data(x[0],x[1])), reverse=True)
-        for pair in pairs:
+        us, vs, counts = self._pair_counts(order)
+        for pair in zip(us, vs):
             yield pair
 
-    def export(self, outpath, style='html', gte=0, verbose=False):
+    def _pair_counts(self, order=None, labels=True):
+        '''Return the ``u`` nodes, ``v`` nodes, and numbers of links of all pairs (as lists) in the given order (see ``traverse_pairs``),
+        using the table's cached orderings. Nodes are labels if ``labels`` is ``True``, otherwise node IDs'''
+        t = self.table
+        if order in {'ascending', 'descending'}:
+            pairs = t.sorted_pairs(order)
+            us = t.pair_u[pairs].tolist(); vs = t.pair_v[pairs].tolist(); counts = t.counts[pairs].tolist()
+        else:
+            us = t.pair_u.tolist(); vs = t.pair_v.tolist(); counts = t.counts.tolist()
+        if labels:
+            us = [t.nodes[u] for u in us]; vs = [t.nodes[v] for v in vs]
+        return us, vs, counts
+
+    def top_pairs(self, k):
+        '''Iterate over the ``k`` student pairs with the most links, in the same order as ``traverse_pairs('descending')``,
+        selecting them in linear time rather than sorting every pair
+
+        Args:
+            ``k`` (``int``): The number of pairs
+
+        Returns:
+            iterator: The ``(num_links, u, v)`` of each pair
+        '''
+        if not isinstance(k, int):
+            raise TypeError("'k' must be an 'int', but you provided a '%s'" % type(k).__name__)
+        if k < 0:
+            raise ValueError("'k' must be non-negative, but yours was %d" % k)
+        t = self.table
+        if 'descending' in t._sorted: # the full order has already been computed
+            pairs = t.sorted_pairs('descending')[:k]
+        else:
+            pairs = top_indices(t.counts, k)
+        return self._iter_pairs(pairs, t.counts)
+
+    def top_matches(self, k):
+        '''Iterate over the ``k`` file matches (i.e., links) with the highest percent similarity (the larger of the two files' percents),
+        in the same order as the rows of ``get_summary``, selecting them in linear time rather than sorting every link
+
+        Args:
+            ``k`` (``int``): The number of matches
+
+        Returns:
+            iterator: The ``(u, u_filename, u_percent, v, v_filename, v_percent)`` of each match
+        '''
+        if not isinstance(k, int):
+            raise TypeError("'k' must be an 'int', but you provided a '%s'" % type(k).__name__)
+        if k < 0:
+            raise ValueError("'k' must be non-negative, but yours was %d" % k)
+        t = self.table
+        return self._iter_matches(top_indices(maximum(t.links['u_percent'], t.links['v_percent']), k))
+
+    def pairs_over(self, min_links=1, min_percent=0):
+        '''Iterate over the student pairs with at least ``min_links`` links in which either file's percent similarity is at least ``min_percent``
+        (in no particular order, without sorting)
+
+        Args:
+            ``min_links`` (``int``): The minimum number of (counted) links of a pair
+
+            ``min_percent`` (``int``): The minimum percent similarity of a link to be counted
+
+        Returns:
+            iterator: The ``(num_links, u, v)`` of each pair, where ``num_links`` is the number of counted links
+        '''
+        if not isinstance(min_links, int):
+            raise TypeError("'min_links' must be an 'int', but you provided a '%s'" % type(min_links).__name__)
+        if not isinstance(min_percent, int):
+            raise TypeError("'min_percent' must be an 'int', but you provided a '%s'" % type(min_percent).__name__)
+        counts = pair_counts(self.table, min_percent)
+        return self._iter_pairs(flatnonzero(counts >= max(min_links, 1)), counts)
+
+    def _iter_pairs(self, pairs, counts):
+        '''Iterate over the ``(counts[i], u, v)`` of each pair index ``i`` of ``pairs`` (converting at most ``CHUNK_SIZE`` pairs at a time)'''
+        t = self.table; nodes = t.nodes
+        for start in range(0, len(pairs), CHUNK_SIZE):
+            chunk = pairs[start:start+CHUNK_SIZE]
+            for n, u, v in zip(counts[chunk].tolist(), t.pair_u[chunk].tolist(), t.pair_v[chunk].tolist()):
+                yield n, nodes[u], nodes[v]
+
+    def _iter_matches(self, links):
+        '''Iterate over the ``(u, u_filename, u_percent, v, v_filename, v_percent)`` of each link index of ``links`` (converting at most ``CHUNK_SIZE`` links at a time)'''
+        t = self.table; nodes = t.nodes; files = t.files
+        for start in range(0, len(links), CHUNK_SIZE):
+            chunk = links[start:start+CHUNK_SIZE]; pairs = searchsorted(t.offsets, chunk, side='right') - 1; l = t.links[chunk]
+            for u, v, u_file, v_file, u_percent, v_percent in zip(t.pair_u[pairs].tolist(), t.pair_v[pairs].tolist(), l['u_file'].tolist(), l['v_file'].tolist(), l['u_percent'].tolist(), l['v_percent'].tolist()):
+                yield nodes[u], files[u_file], u_percent, nodes[v], files[v_file], v_percent
+
+    def iter_links(self, html=False):
+        '''Iterate over every (undirected) link as a flat record, reading the link table directly (converting at most ``CHUNK_SIZE`` links at a time)
+        rather than building a graph or dictionary of the whole network
+
+        Args:
+            ``html`` (``bool``): ``True`` to also yield the HTML of both files (``None`` if it wasn't downloaded, see ``build(lazy=True)``), otherwise ``False``
+
+        Returns:
+            iterator: The ``(u, v, u_filename, v_filename, u_percent, v_percent)`` of each link (followed by ``u_html`` and ``v_html`` if ``html``), in pair order
+        '''
+        t = self.table; nodes = t.nodes; files = t.files
+        for link_pairs, links in link_chunks(t):
+            rows = zip(t.pair_u[link_pairs].tolist(), t.pair_v[link_pairs].tolist(), links['u_file'].tolist(), links['v_file'].tolist(), links['u_percent'].tolist(), links['v_percent'].tolist())
+            if html:
+                for (u, v, u_file, v_file, u_percent, v_percent), u_blob, v_blob in zip(rows, links['u_blob'].tolist(), links['v_blob'].tolist()):
+                    yield nodes[u], nodes[v], files[u_file], files[v_file], u_percent, v_percent, (None if u_blob == NO_ID else self.blobs.get(u_blob)), (None if v_blob == NO_ID else self.blobs.get(v_blob))
+            else:
+                for u, v, u_file, v_file, u_percent, v_percent in rows:
+                    yield nodes[u], nodes[v], files[u_file], files[v_file], u_percent, v_percent
+
+    def snippet_index(self, num_perm=128, bands=32, shingle_size=5):
+        '''Return the MinHash/LSH index of the matched source code snippets (HTML) of this ``MossNet``, computing signatures only for HTML
+        that isn't in it yet (e.g. HTML added by ``build(base=...)``). The index is saved and loaded alongside this ``MossNet`` (see ``save``)
+
+        Args:
+            ``num_perm`` (``int``): The number of hash functions (only used if this ``MossNet`` doesn't have a snippet index yet)
+
+            ``bands`` (``int``): The number of LSH bands (only used if this ``MossNet`` doesn't have a snippet index yet)
+
+            ``shingle_size`` (``int``): The number of consecutive tokens per shingle (only used if this ``MossNet`` doesn't have a snippet index yet)
+
+        Returns:
+            ``SnippetIndex``: The snippet index
+        '''
+        if self._snippets is None:
+            self._snippets = SnippetIndex(num_perm=num_perm, bands=bands, shingle_size=shingle_size)
+        with self.metrics.stage('snippet_index') as stage:
+            stage.items = self._snippets.update(self.blobs)
+        return self._snippets
+
+    def similar_snippets(self, threshold=0.5, new_only=True, max_bucket=100):
+        '''Find pairs of students whose matched snippets are near-duplicates (estimated Jaccard similarity of their token shingles), e.g. across
+        different problems or semesters that MOSS never compared, via the LSH index of ``snippet_index`` (without comparing every pair of snippets)
+
+        Args:
+            ``threshold`` (``float``): The minimum estimated similarity (in [0, 1]) of a pair
+
+            ``new_only`` (``bool``): ``True`` to omit pairs of files that MOSS already compared (i.e., that are linked), otherwise ``False``
+
+            ``max_bucket`` (``int``): Ignore LSH buckets with more than this many snippets (e.g. boilerplate or starter code)
+
+        Returns:
+            ``list`` of ``tuple``: The ``(similarity, u, u_filename, v, v_filename)`` of each pair of files, in decreasing order of similarity
+        '''
+        if not isinstance(threshold, float) and not isinstance(threshold, int):
+            raise TypeError("'threshold' must be a 'float', but you provided a '%s'" % type(threshold).__name__)
+        if threshold < 0 or threshold > 1:
+            raise ValueError("'threshold' must be between 0 and 1, but yours was %s" % threshold)
+        if not isinstance(max_bucket, int):
+            raise TypeError("'max_bucket' must be an 'int', but you provided a '%s'" % type(max_bucket).__name__)
+        index = self.snippet_index()
+        with self.metrics.stage('similar_snippets') as stage:
+            out = similar_snippets(self.table, self.blobs, index, threshold=threshold, new_only=new_only, max_bucket=max_bucket); stage.items = len(out)
+        return out
+
+    def serve(self, host='127.0.0.1', port=8000, page_size=100, cache_bytes=67108864, verbose=False, block=True):
+        '''Serve this ``MossNet`` over HTTP as a read-only website (an alternative to ``export(style='html')`` that needs no export):
+        a summary of its pairs in descending order of number of links, ``page_size`` pairs per page, and the ``get_pair(style='html')`` page of each pair,
+        rendered when it's first requested and kept in an LRU cache of at most ``cache_bytes`` bytes
+
+        Args:
+            ``host`` (``str``): The host to listen on
+
+            ``port`` (``int``): The port to listen on (0 to pick a free port)
+
+            ``page_size`` (``int``): The number of pairs per summary page
+
+            ``cache_bytes`` (``int``): The maximum total size (in bytes) of the cached pair pages
+
+            ``verbose`` (``bool``): ``True`` to log every request, otherwise ``False``
+
+            ``block`` (``bool``): ``True`` to serve until interrupted, otherwise ``False`` to serve from a background thread
+
+        Returns:
+            ``MossNetServer``: The server (call ``shutdown()`` to stop it, if ``block`` is ``False``)
+        '''
+        from mossnet.server import serve # the HTTP server is only imported when it's needed
+        for name, value in [('port', port), ('page_size', page_size), ('cache_bytes', cache_bytes)]:
+            if not isinstance(value, int):
+                raise TypeError("'%s' must be an 'int', but you provided a '%s'" % (name, type(value).__name__))
+        if page_size < 1:
+            raise ValueError("'page_size' must be positive, but yours was %d" % page_size)
+        return serve(self, host=host, port=port, page_size=page_size, cache_bytes=cache_bytes, verbose=verbose, block=block)
+
+    def export(self, outpath, style='html', gte=0, verbose=False, processes=1, min_percent=0, html=True):
         '''Export the links in this ``MossNet`` in the specified style
 
         Args:
@@ -246,17 +681,32 @@ class MossNet:
 
             ``style`` (``str``): Desired output style
 
-            ``gte`` (``int``): The minimum number of links for an edge to be exported
+            * ``"columns"`` to export every link (see ``iter_links``) as a folder of columns: a CSV file and NumPy arrays (see ``export.write_columns``)
+
+            * ``"csv"`` to export as a CSV edge list (columns ``u``, ``v``, and ``links``)
 
             * ``"dot"`` to export as a GraphViz DOT file
 
             * ``"gexf"`` to export as a Graph Exchange XML Format (GEXF) file
 
+            * ``"graphml"`` to export as a GraphML file
+
             * ``"html"`` to export one HTML file per pair
 
+            * ``"jsonl"`` to export every link (see ``iter_links``) as a JSON Lines file (one object per link)
+
+            ``gte`` (``int``): The minimum number of links for an edge to be exported
+
             ``verbose`` (``bool``): ``True`` to show verbose messages, otherwise ``False``
+
+            ``processes`` (``int``): The number of processes to render HTML files with (``"html"`` style only)
+
+            ``min_percent`` (``int``): Only count links in which either file's percent similarity is at least ``min_percent`` (graph and link styles only;
+            link styles only export those links)
+
+            ``html`` (``bool``): ``True`` to include the HTML of each link, otherwise ``False`` (``"jsonl"`` and ``"columns"`` styles only)
         '''
-        if style not in {'dot', 'gexf', 'html'}:
+        if style != 'html' and style not in WRITERS and style not in LINK_WRITERS:
             raise ValueError("Invalid export style: %s" % style)
         if isdir(outpath) or isfile(outpath):
             raise ValueError("Output path exists: %s" % outpath)
@@ -264,97 +714,204 @@ class MossNet:
             raise TypeError("'gte' must be an 'int', but you provided a '%s'" % type(gte).__name__)
         if gte < 0:
             raise ValueError("'gte' must be non-negative, but yours was %d" % gte)
+        if not isinstance(processes, int):
+            raise TypeError("'processes' must be an 'int', but you provided a '%s'" % type(processes).__name__)
+        if processes < 1:
+            raise ValueError("'processes' must be positive, but yours was %d" % processes)
+        if not isinstance(min_percent, int):
+            raise TypeError("'min_percent' must be an 'int', but you provided a '%s'" % type(min_percent).__name__)
+        if min_percent < 0:
+            raise ValueError("'min_percent' must be non-negative, but yours was %d" % min_percent)
+
+        with self.metrics.stage('export_%s' % style) as stage:
+            # export as folder of HTML files
+            if style == 'html':
+                makedirs(outpath)
+                f = open('%s/summary.html' % outpath, 'w')
+                for chunk in self._summary_chunks():
+                    f.write(chunk)
+                f.close()
+                us, vs, counts = self._pair_counts('descending')
+                num_pairs = sum(1 for n in counts if n >= gte); start_time = time()
+                tasks = (("%s/%d_%s_%s.html" % (outpath, curr_num_links, u, v), u, v, self._pair_links(u, v)) for u,v,curr_num_links in zip(us, vs, counts) if curr_num_links >= gte)
+                if processes == 1 or num_pairs < MIN_PARALLEL_PAIRS:
+                    done = map(_write_pair_htmls, _chunks(tasks, 1))
+                else: # pairs are sent to processes in chunks, as sending each pair separately costs more than rendering it
+                    done = _bounded_map(_write_pair_htmls, _chunks(tasks, max(1, min(EXPORT_CHUNK_PAIRS, num_pairs // (8*processes)))), processes)
+                num_done = 0
+                for n in done:
+                    num_done += n
+                    if verbose:
+                        print("Exporting pair %d of %d (%.1f pairs/second)..." % (num_done, num_pairs, num_done/max(time()-start_time, 1e-9)), end='\r')
+                if verbose:
+                    print("Successfully exported %d pairs in %.1f seconds" % (num_pairs, time()-start_time))
+                stage.items = num_pairs
 
-        # export as folder of HTML files
-        if style == 'html':
-            summary = self.get_summary(style='html')
-            pairs = list(self.traverse_pairs(order=None))
-            makedirs(outpath)
-            f = open('%s/summary.html' % outpath, 'w'); f.write(summary); f.close()
-            for i,pair in enumerate(pairs):
+            # export every link (one streaming pass over the links)
+            elif style in LINK_WRITERS:
                 if verbose:
-                    print("Exporting pair %d of %d..." % (i+1, len(pairs)), end='\r')
-                u,v = pair
-                if self.num_links(u,v) < gte:
-                    continue
-                if style == 'html':
-                    f = open("%s/%d_%s_%s.html" % (outpath, self.num_links(u,v), u, v), 'w')
-                    f.write(self.get_pair(u, v, style='html'))
-                    f.close()
-            if verbose:
-                print("Successfully exported %d pairs" % len(pairs))
-
-        # export as GraphViz DOT or a GEXF file
-        elif style in {'dot', 'gexf'}:
-            if verbose:
-                print("Computing colors...", end='')
-            max_links = max(self.num_links(u,v) for u,v in self.traverse_pairs())
-            try:
-                from seaborn import color_palette
-            except:
-                raise RuntimeError("Exporting as a DOT or GEXF file currently requires seaborn")
-            pal = color_palette("Reds", max_links)
-            if verbose:
-                print(" done")
-                print("Computing node information...", end='')
-            nodes = list(self.get_nodes())
-            index = {u:i for i,u in enumerate(nodes)}
-            if verbose:
-                print(" done")
-                print("Writing output file...", end='')
-            outfile = open(outpath, 'w')
-            if style == 'dot':
-                pal = [str(c).upper() for c in pal.as_hex()]
-                outfile.write("graph G {\n")
-                for u in nodes:
-                    outfile.write('  node%d[label="%s"]\n' % (index[u], u))
-                for u,v in self.traverse_pairs():
-                    curr_num_links = self.num_links(u,v)
-                    if curr_num_links < gte:
-                        continue
-                    outfile.write('  node%d -- node%d[color="%s"]\n' % (index[u], index[v], pal[curr_num_links-1]))
-                outfile.write('}\n')
-            elif style == 'gexf':
-                from datetime import datetime
-                pal = [(int(255*c[0]), int(255*c[1]), int(255*c[2])) for c in pal]
-                outfile.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-                outfile.write('<gexf xmlns="http://www.gexf.net/1.3draft" xmlns:viz="http://www.gexf.net/1.3draft/viz">\n')
-                outfile.write('  <meta lastmodifieddate="%s">\n' % datetime.today().strftime('%Y-%m-%d'))
-                outfile.write('    <creator>MossNet</creator>\n')
-                outfile.write('    <description>A MossNet network exported to GEXF</description>\n')
-                outfile.write('  </meta>\n')
-                outfile.write('  <graph mode="static" defaultedgetype="undirected">\n')
-                outfile.write('    <nodes>\n')
-                for u in nodes:
-                    outfile.write('      <node id="%d" label="%s"/>\n' % (index[u], u))
-                outfile.write('    </nodes>\n')
-                outfile.write('    <edges>\n')
-                for i,pair in enumerate(self.traverse_pairs()):
-                    u,v = pair
-                    curr_num_links = self.num_links(u,v)
-                    if curr_num_links == 0:
-                        continue
-                    color = pal[curr_num_links-1]
-                    outfile.write('      <edge id="%d" source="%d" target="%d">\n' % (i, index[u], index[v]))
-                    outfile.write('        <viz:color r="%d" g="%d" b="%d"/>\n' % (color[0], color[1], color[2]))
-                    outfile.write('      </edge>\n')
-                outfile.write('    </edges>\n')
-                outfile.write('  </graph>\n')
-                outfile.write('</gexf>\n')
-            outfile.close()
-            if verbose:
-                print(" done")
-
-def load(mossnet_file):
+                    print("Writing output...", end='')
+                stage.items = export_links(self.table, self.blobs, outpath, style, gte=gte, min_percent=min_percent, html=html)
+                if verbose:
+                    print(" done (%d links)" % stage.items)
+
+            # export as a graph file (one streaming pass over the pairs)
+            else:
+                if verbose:
+                    print("Writing output file...", end='')
+                stage.items = export_graph(self.table, outpath, style, gte=gte, min_percent=min_percent)
+                if verbose:
+                    print(" done (%d edges)" % stage.items)
+
+
+def _pair_html(u, v, links):
+    '''Render the links between ``u`` and ``v`` (see ``MossNet._pair_links``) as a single HTML page'''
+    return '<html>%s</html>' % '<br>'.join(LINK_HTML % (u, u_fn, v, v_fn, u, u_percent, v, v_percent, u_html, v_html) for u_fn, v_fn, u_percent, u_html, v_percent, v_html in links)
+
+def _write_pair_htmls(tasks):
+    '''Write the HTML pages of the links between pairs of nodes, where each task is a ``(path, u, v, links)`` tuple, and return the number of pages written'''
+    for path, u, v, links in tasks:
+        f = open(path, 'w'); f.write(_pair_html(u, v, links)); f.close()
+    return len(tasks)
+
+def _chunks(items, size):
+    '''Iterate over consecutive lists of (at most) ``size`` items of ``items``'''
+    items = iter(items)
+    return iter(lambda: list(islice(items, size)), list())
+
+def _bounded_map(func, items, processes):
+    '''Apply ``func`` to each item of ``items`` across a pool of ``processes`` processes, consuming ``items`` only as results complete (so at most a few items per process are held in memory)
+
+    Yields:
+        The results of ``func`` (in order of completion)
+    '''
+    from concurrent.futures import FIRST_COMPLETED,ProcessPoolExecutor,wait
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = set()
+        for item in items:
+            pending.add(pool.submit(func, item))
+            if len(pending) >= 4*processes:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+def merge(*mossnets):
+    '''Merge any number of ``MossNet`` objects (e.g. one per problem or semester) in a single pass.
+    If multiple networks have the same link (same students and files), the one from the latest network is kept.
+    HTML is shared by reference rather than copied, so networks given as saved indexed files are merged without reading their HTML
+
+    Args:
+        ``mossnets`` (``MossNet`` or ``str``): The ``MossNet`` objects and/or paths of saved ``MossNet`` files
+
+    Returns:
+        ``MossNet``: The merged ``MossNet`` object
+    '''
+    blobs = BlobStore(); tables = list(); blob_maps = list(); fetcher = None; metrics = None
+    for net in mossnets:
+        if isinstance(net, str):
+            net = load(net)
+        elif not isinstance(net, MossNet):
+            raise TypeError("Can only merge 'MossNet' objects and saved 'MossNet' files, but you provided a '%s'" % type(net).__name__)
+        blob_maps.append(nparray([blobs.add_from(net.blobs, i) for i in range(len(net.blobs))], dtype=int64))
+        tables.append(net.table)
+        if fetcher is None:
+            fetcher = net.fetcher
+        if metrics is None and net.metrics:
+            metrics = net.metrics
+    table, num_duplicates = merge_tables(tables, blob_maps)
+    if num_duplicates != 0:
+        warn("%d links found in multiple networks. Taking latest version" % num_duplicates)
+    if any(t._node_stats is not None for t in tables): # keep the per-node statistics of networks that use them up to date
+        table.node_stats()
+    return MossNet(table, fetcher=fetcher, blobs=blobs, metrics=metrics)
+
+def load(mossnet_file, fetcher=None, metrics=None):
     '''Load a ``MossNet`` object from file
 
     Args:
         ``mossnet_file`` (``str``): The desired input file
 
+        ``fetcher`` (``Fetcher``): The ``Fetcher`` used to download match HTML that wasn't downloaded when building (see ``build(lazy=True)``)
+
+        ``metrics`` (``Metrics``): A ``Metrics`` object in which to record timings of loading (and later using) the ``MossNet`` object, or ``None`` to not record
+
     Returns:
         ``MossNet``: The resulting ``MossNet`` object
     '''
+    if metrics is None:
+        metrics = NULL_METRICS
+    with metrics.stage('load') as stage:
+        net = _load(mossnet_file, fetcher, metrics); stage.items = len(net.table.links)
+        if isfile(mossnet_file + SNIPPETS_SUFFIX):
+            net._snippets = SnippetIndex.load(mossnet_file + SNIPPETS_SUFFIX)
+    return net
+
+def _load(mossnet_file, fetcher, metrics):
+    f = open(mossnet_file, 'rb'); is_indexed = (f.read(len(INDEXED_MAGIC)) == INDEXED_MAGIC); f.close()
+    if is_indexed:
+        return _load_indexed(mossnet_file, fetcher=fetcher, metrics=metrics)
     if mossnet_file.lower().endswith('.gz'):
-        return MossNet(pklload(gopen(mossnet_file)))
+        f = gopen(mossnet_file)
     else:
-        return MossNet(pklload(open(mossnet_file,'rb')))
+        f = open(mossnet_file,'rb')
+    data = pklload(f); f.close()
+    if isinstance(data, tuple) and len(data) == 4 and data[0] == SAVE_FORMAT:
+        if data[1] != SAVE_VERSION:
+            raise ValueError("Unsupported MossNet file version: %s" % data[1])
+        d = data[3]; table = LinkTable(d['nodes'], d['files'], d['urls'], d['pair_u'], d['pair_v'], d['offsets'], d['links'])
+        return MossNet(table, fetcher=fetcher, blobs=BlobStore(data[2], digests=d['digests']), metrics=metrics)
+    return MossNet(data, fetcher=fetcher, metrics=metrics)
+
+def _dict_records(moss_results_dict, intern):
+    '''Iterate over the links of a 3D dictionary of MOSS results as ``table_from_records`` records'''
+    for u in moss_results_dict:
+        u_edges = moss_results_dict[u]
+        if not isinstance(u_edges, dict):
+            raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
+        for v in u_edges:
+            u_v_links = u_edges[v]
+            if not isinstance(u_edges[v], dict):
+                raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
+            for f in u_v_links:
+                try:
+                    if len(u_v_links[f]) == 2:
+                        left, right = u_v_links[f]; source = None
+                    else:
+                        left, right, source = u_v_links[f]
+                    u_fn, v_fn = f
+                    record = (u, v, u_fn, v_fn, left[0], intern(left[1]), right[0], intern(right[1]), source)
+                except:
+                    raise TypeError("moss_results_dict must be a 3D dictionary of MOSS results")
+                yield record
+
+def _write_index(f, t, sections, digests):
+    '''Write the index of a ``MossNet`` whose links are the ``LinkTable`` ``t`` and whose HTML is in ``sections`` (see ``MappedBlobStore``) and the footer to the end of ``f``'''
+    index = pkldumps({'version':INDEXED_VERSION, 'nodes':t.nodes, 'files':t.files, 'urls':t.urls, 'pair_u':t.pair_u, 'pair_v':t.pair_v, 'offsets':t.offsets, 'links':t.links, 'blob_sections':sections, 'digests':digests}, protocol=HIGHEST_PROTOCOL)
+    index_offset = f.tell(); f.write(index); f.write(pack(INDEXED_FOOTER, index_offset, len(index), INDEXED_MAGIC))
+
+def _load_indexed(mossnet_file, fetcher=None, metrics=None):
+    '''Load a ``MossNet`` object saved in the indexed format (its HTML is memory-mapped rather than read)'''
+    f = open(mossnet_file, 'rb'); f.seek(-calcsize(INDEXED_FOOTER), SEEK_END)
+    index_offset, index_length, magic = unpack(INDEXED_FOOTER, f.read(calcsize(INDEXED_FOOTER)))
+    if magic != INDEXED_MAGIC:
+        f.close(); raise ValueError("Invalid or truncated MossNet file: %s" % mossnet_file)
+    f.seek(index_offset); index = pklloads(f.read(index_length)); f.close()
+    if index['version'] != INDEXED_VERSION:
+        raise ValueError("Unsupported MossNet file version: %s" % index['version'])
+    blobs = MappedBlobStore(mossnet_file, index['blob_sections'], index['digests'])
+    table = LinkTable(index['nodes'], index['files'], index['urls'], index['pair_u'], index['pair_v'], index['offsets'], index['links'])
+    return MossNet(table, fetcher=fetcher, blobs=blobs, metrics=metrics)
+
+def convert(infile, outfile, style=None):
+    '''Convert a saved ``MossNet`` object from one file format to another (e.g. pickle to indexed)
+
+    Args:
+        ``infile`` (``str``): The input file (in any format ``load`` can read)
+
+        ``outfile`` (``str``): The desired output file's path
+
+        ``style`` (``str``): The output file format (see ``MossNet.save``)
+    '''
+    load(infile).save(outfile, style=style)
@@ -1,3 +1,4 @@
 from mossnet.build import build
-from mossnet.MossNet import MossNet,load
-__all__ = ['build', 'load', 'MossNet']
+from mossnet.metrics import Metrics
+from mossnet.MossNet import MossNet,convert,load,merge
+__all__ = ['build', 'convert', 'load', 'merge', 'Metrics', 'MossNet']
@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+from bisect import bisect_right
+from hashlib import blake2b
+from mmap import ACCESS_READ,mmap
+
+def digest(text):
+    '''Return the content address of a string
+
+    Args:
+        ``text`` (``str``): The string
+
+    Returns:
+        ``bytes``: The 16-byte BLAKE2b digest of ``text``
+    '''
+    return blake2b(text.encode(), digest_size=16).digest()
+
+class BlobStore:
+    def __init__(self, blobs=None, digests=None):
+        '''Create a content-addressed store of strings (e.g. match HTML), in which each distinct string is held once
+
+        Args:
+            ``blobs`` (``list``): Initial strings (in order of their IDs), or ``None`` for an empty store
+
+            ``digests`` (``bytes``): The concatenated digests of ``blobs`` (which must be distinct), e.g. as saved by ``MossNet.save``, so they aren't recomputed,
+            or ``None`` to compute them
+
+        Returns:
+            ``BlobStore``: A ``BlobStore`` object
+        '''
+        self.blobs = list() # each entry is a string or a (store, blob ID) reference to a string in another store
+        self.digests = list(); self.index = dict() # key = digest; value = blob ID
+        if blobs is not None and digests is not None: # trusted (e.g. saved by this package), so the strings aren't rehashed
+            self.blobs = list(blobs); self.digests = [digests[16*i:16*(i+1)] for i in range(len(self.blobs))]
+            self.index = dict(zip(self.digests, range(len(self.digests))))
+        elif blobs is not None:
+            for text in blobs:
+                self.add(text)
+
+    def __len__(self):
+        return len(self.blobs)
+
+    def _ensure_index(self):
+        '''Make sure ``self.index`` is built (it always is for in-memory stores)'''
+        pass
+
+    def _entry(self, blob_id):
+        '''Return the string, or the ``(store, blob ID)`` reference to it, that another store should hold to refer to a string in this one'''
+        return self.blobs[blob_id]
+
+    def add(self, text):
+        '''Add a string to this store (if an identical string isn't already in it)
+
+        Args:
+            ``text`` (``str``): The string, or ``None`` (e.g. HTML that hasn't been downloaded yet)
+
+        Returns:
+            ``int``: The ID of ``text`` in this store, or ``None`` if ``text`` is ``None``
+        '''
+        if text is None:
+            return None
+        self._ensure_index(); key = digest(text)
+        if key not in self.index:
+            self.index[key] = len(self); self.blobs.append(text); self.digests.append(key)
+        return self.index[key]
+
+    def add_from(self, store, blob_id):
+        '''Add a string from another store (if an identical string isn't already in this one) by reference, without reading it
+
+        Args:
+            ``store`` (``BlobStore``): The other store
+
+            ``blob_id`` (``int``): The ID of the string in ``store``, or ``None``
+
+        Returns:
+            ``int``: The ID of the string in this store, or ``None`` if ``blob_id`` is ``None``
+        '''
+        if blob_id is None:
+            return None
+        self._ensure_index(); key = store.digest(blob_id)
+        if key not in self.index:
+            self.index[key] = len(self); self.blobs.append(store._entry(blob_id)); self.digests.append(key)
+        return self.index[key]
+
+    def digest(self, blob_id):
+        '''Return the content address of a string in this store
+
+        Args:
+            ``blob_id`` (``int``): The ID of the string
+
+        Returns:
+            ``bytes``: The digest of the string
+        '''
+        return self.digests[blob_id]
+
+    def get(self, blob_id):
+        '''Return a string from this store
+
+        Args:
+            ``blob_id`` (``int``): The ID of the string, or ``None``
+
+        Returns:
+            ``str``: The string, or ``None`` if ``blob_id`` is ``None``
+        '''
+        if blob_id is None:
+            return None
+        entry = self.blobs[blob_id]
+        if isinstance(entry, tuple):
+            return entry[0].get(entry[1])
+        return entry
+
+class MappedBlobStore(BlobStore):
+    def __init__(self, path, sections, digests):
+        '''Open read-only, memory-mapped sections of a file of UTF-8 strings as a ``BlobStore`` (strings added later are held in memory)
+
+        Args:
+            ``path`` (``str``): Path to the file
+
+            ``sections`` (``list``): The ``(start, offsets)`` of each section, where ``start`` is the byte offset at which the section starts,
+            and ``offsets`` (``array``) are the byte offsets (relative to ``start``) of each string in it, plus the end offset of its last string
+
+            ``digests`` (``bytes``): The concatenated 16-byte digests of the strings (of all sections, in order)
+
+        Returns:
+            ``MappedBlobStore``: A ``MappedBlobStore`` object
+        '''
+        BlobStore.__init__(self); self.index = None # the digest index is only built if a string is added
+        self.path = path; self.sections = list(); self.firsts = list(); self.mapped_digests = digests; self.num_mapped = 0
+        for start, offsets in sections:
+            self.sections.append((start, offsets)); self.firsts.append(self.num_mapped); self.num_mapped += len(offsets)-1
+        self.file = open(path, 'rb'); self.mm = mmap(self.file.fileno(), 0, access=ACCESS_READ); self.size = len(self.mm)
+
+    def __len__(self):
+        return self.num_mapped + len(self.blobs)
+
+    def _ensure_index(self):
+        if self.index is None:
+            self.index = {self.digest(i):i for i in range(self.num_mapped)}
+
+    def _entry(self, blob_id):
+        if blob_id < self.num_mapped:
+            return (self, blob_id)
+        return self.blobs[blob_id-self.num_mapped]
+
+    def digest(self, blob_id):
+        if blob_id < self.num_mapped:
+            return self.mapped_digests[16*blob_id:16*(blob_id+1)]
+        return self.digests[blob_id-self.num_mapped]
+
+    def get(self, blob_id):
+        if blob_id is None:
+            return None
+        if blob_id < self.num_mapped:
+            s = 0 if len(self.sections) == 1 else bisect_right(self.firsts, blob_id)-1
+            start, offsets = self.sections[s]; i = blob_id - self.firsts[s]
+            return self.mm[start+offsets[i]:start+offsets[i+1]].decode()
+        return BlobStore.get(self, blob_id-self.num_mapped)
+
+    def extend(self, start, offsets):
+        '''Map a new section (at byte offset ``start``, with string offsets ``offsets``), just appended to the file, that holds (in order) the strings that were held in memory'''
+        if len(offsets)-1 != len(self.blobs):
+            raise ValueError("The new section must hold every string held in memory")
+        self.mm.close(); self.mm = mmap(self.file.fileno(), 0, access=ACCESS_READ); self.size = len(self.mm)
+        if len(offsets) > 1:
+            self.sections.append((start, offsets)); self.firsts.append(self.num_mapped)
+        self.mapped_digests += b''.join(self.digests); self.num_mapped += len(self.blobs); self.blobs = list(); self.digests = list() # blob IDs are unchanged, so the index stays valid
+
+    def close(self):
+        '''Close the underlying file'''
+        self.mm.close(); self.file.close()
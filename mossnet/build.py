@@ -1,12 +1,120 @@
 #! /usr/bin/env python
-from mossnet.MossNet import MossNet
-from bs4 import BeautifulSoup
-from re import search,sub
+from mossnet.metrics import NULL_METRICS
+from mossnet.MossNet import MossNet,load
+from mossnet.table import NO_ID
+from html.parser import HTMLParser
+from numpy import int64
+from numpy import array as nparray
+from re import compile as recompile
 from sys import stderr
-from urllib.request import urlopen
+from time import perf_counter
 from warnings import warn
 
-def build(moss_results_links, verbose=False):
+ANCHOR_RE = recompile(r'<(A|/A).*?>')
+TIMEOUT = 60 # default socket timeout (seconds) of downloads
+
+class _ReportParser(HTMLParser):
+    '''Incremental parser of the rows of a MOSS report's index table'''
+    def __init__(self):
+        HTMLParser.__init__(self); self.rows = list(); self.cells = None; self.anchor = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr': # MOSS doesn't close its TR/TD tags, so a row ends when the next one starts
+            self.end_row(); self.cells = list()
+        elif tag == 'td' and self.cells is not None:
+            self.cells.append(None)
+        elif tag == 'a' and self.cells and self.cells[-1] is None:
+            href = dict(attrs).get('href', None)
+            if href is not None:
+                self.anchor = [href]; self.cells[-1] = self.anchor
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self.anchor = None
+        elif tag == 'table':
+            self.end_row()
+
+    def handle_data(self, data):
+        if self.anchor is not None:
+            self.anchor.append(data)
+
+    def end_row(self):
+        cells = self.cells; self.cells = None; self.anchor = None
+        if cells is None or len(cells) != 3:
+            return
+        if cells[0] is None or cells[1] is None:
+            stderr.write("Failed to parse row: %s\n" % cells); return
+        texts = [''.join(cells[i][1:]) for i in [0,1]]
+        curr_filename1,curr_filename2 = [text.split('/')[-1].split()[0].strip() for text in texts]
+        email1,email2 = [text.split('/')[-2] for text in texts]
+        percent1,percent2 = [int(text.split('(')[-1].split('%')[0]) for text in texts]
+        self.rows.append((cells[0][0], email1, curr_filename1, percent1, email2, curr_filename2, percent2))
+
+def _parse_report(chunks, metrics=NULL_METRICS):
+    '''Parse the rows of a MOSS report's index table incrementally
+
+    Args:
+        ``chunks`` (iterable): Consecutive pieces of the HTML of a MOSS report's index page
+
+        ``metrics`` (``Metrics``): A ``Metrics`` object in which to record parsing time
+
+    Yields:
+        ``tuple``: The ``(moss_url, email1, filename1, percent1, email2, filename2, percent2)`` tuple of each row
+    '''
+    parser = _ReportParser()
+    for chunk in chunks:
+        with metrics.stage('parse_report'):
+            parser.feed(chunk)
+        if len(parser.rows) != 0:
+            rows = parser.rows; parser.rows = list()
+            for row in rows:
+                yield row
+    parser.close(); parser.end_row()
+    for row in parser.rows:
+        yield row
+
+def _parse_frameset(html, moss_url):
+    '''Return the URLs of the top, left, and right frames of a MOSS match'''
+    moss_url_base = '/'.join(moss_url.rstrip('/').split('/')[:-1]); parts = html.split('<FRAME SRC=')
+    return ['%s/%s' % (moss_url_base, parts[i].split(' ')[0].replace('"','')) for i in [1,2,3]]
+
+def _parse_top(html):
+    '''Return the left and right percents of a MOSS match's top frame'''
+    return [int(part.split('(')[-1]) for part in html.split("%")[:2]]
+
+def _parse_source(html):
+    '''Return the source code of a MOSS match's left/right frame, without its anchors'''
+    return ANCHOR_RE.sub("", html.split("<HR>")[1].split("</BODY>")[0].split("<PRE>")[1].split("</PRE>")[0].strip())
+
+def _fetch_match(fetcher, moss_url, email1, email2):
+    '''Download a single MOSS match (the frameset and its top, left, and right frames)
+
+    Args:
+        ``fetcher`` (``Fetcher``): The ``Fetcher`` to download with
+
+        ``moss_url`` (``str``): The URL of the match
+
+        ``email1`` (``str``): The email of the left student
+
+        ``email2`` (``str``): The email of the right student
+
+    Returns:
+        ``tuple``: The ``(left_percent, left_html, right_percent, right_html)`` of the match
+    '''
+    main_html = fetcher.get(moss_url)
+    if email1 not in main_html or email2 not in main_html:
+        raise RuntimeError("Didn't find the right email addresses in the match URL: %s" % moss_url)
+    with fetcher.metrics.stage('parse_frameset'):
+        top_url, left_url, right_url = _parse_frameset(main_html, moss_url)
+    top_html = fetcher.get(top_url)
+    with fetcher.metrics.stage('parse_top'):
+        left_percent,right_percent = _parse_top(top_html)
+    left_html = fetcher.get(left_url); right_html = fetcher.get(right_url)
+    with fetcher.metrics.stage('parse_source'):
+        left_html = _parse_source(left_html); right_html = _parse_source(right_html)
+    return left_percent, left_html, right_percent, right_html
+
+def build(moss_results_links, verbose=False, threads=1, cache=None, cache_size=None, journal=None, lazy=False, min_percent=0, metrics=None, base=None, timeout=TIMEOUT, retries=5, rate=None, spill=None, spill_memory=None):
     '''Download MOSS results into a ``MossNet`` object
 
     Args:
@@ -14,34 +122,97 @@ def build(moss_results_links, verbose=False):
 
         ``verbose`` (``bool``): ``True`` to show verbose messages, otherwise ``False``
 
+        ``threads`` (``int``): The maximum number of matches to download concurrently (fewer are downloaded at once while the server shows signs of congestion)
+
+        ``cache`` (``str``): Path to a folder in which to cache downloaded pages (reused across runs), or ``None`` to not cache
+
+        ``cache_size`` (``int``): The maximum size (in bytes) of the cache, or ``None`` for no limit
+
+        ``journal`` (``str``): Path to a checkpoint journal of finished matches (a rerun skips matches already in it), or ``None`` to not checkpoint
+
+        ``lazy`` (``bool``): ``True`` to build the network from the report index pages alone (match HTML is downloaded the first time it's needed), otherwise ``False``
+
+        ``min_percent`` (``int``): Skip matches in which neither file's percent similarity is at least ``min_percent``
+
+        ``metrics`` (``Metrics``): A ``Metrics`` object in which to record timings of each stage (downloading, parsing, and building) and every download, or ``None`` to not record
+
+        ``base`` (``MossNet`` or ``str``): An existing ``MossNet`` object (or the path of a saved one) to add the results to, or ``None`` to build a new one.
+        Matches whose (email, email, files) are already in ``base`` aren't downloaded, and ``base`` is updated in place, so saving it back
+        to the indexed file it was loaded from only appends the new HTML
+
+        ``timeout`` (``float``): The socket timeout (in seconds) of each download, or ``None`` for no timeout
+
+        ``retries`` (``int``): The maximum number of times a download is retried after a transient error (e.g. a timeout, reset connection, or HTTP 429/503), with exponential backoff
+
+        ``rate`` (``float``): The maximum number of downloads started per second per host, or ``None`` for no limit
+
+        ``spill`` (``str``): Path of an indexed ``MossNet`` file (see ``MossNet.save``) into which to stream matches as they're downloaded, so the HTML is never all
+        held in memory (the resulting ``MossNet`` memory-maps it from the file), or ``None`` to build in memory. The file is overwritten
+
+        ``spill_memory`` (``int``): The maximum size (in bytes) of the HTML and links held in memory before they're written to ``spill``, or ``None`` for the default (``SPILL_MEMORY``)
+
     Returns:
-        ``MossNet``: A ``MossNet`` object
+        ``MossNet``: A ``MossNet`` object (``base``, if given)
     '''
+    from mossnet.cache import MatchJournal,ResponseCache # the HTTP stack is only imported once something is downloaded
+    from mossnet.fetch import Fetcher
+    from mossnet.schedule import Scheduler
+    if metrics is None:
+        metrics = NULL_METRICS
+    start = perf_counter()
+    if isinstance(base, str):
+        base = load(base, metrics=metrics)
+    elif base is not None and not isinstance(base, MossNet):
+        raise TypeError("'base' must be a 'MossNet' or the path of a saved 'MossNet', but you provided a '%s'" % type(base).__name__)
     if isinstance(moss_results_links, str):
         urls = [l.strip() for l in open(moss_results_links.strip()).read().strip().splitlines()]
     else:
         urls = [l.strip() for l in moss_results_links]
-    links = dict()
-    for url_num,url in enumerate(urls):
-        parsing_report_str = "Parsing MOSS report %d of %d..." % (url_num+1, len(urls))
-        if verbose:
-            stderr.write("%s\r" % parsing_report_str)
-        bs = BeautifulSoup(urlopen(url).read().decode(), "lxml")
-        curr_filename1 = None; curr_filename2 = None
-        bs_findall = list(bs.findAll('tr'))
-        for row_num, row in enumerate(bs_findall):
-            stderr.write("%s Row %d of %d\r" % (parsing_report_str, row_num+1, len(bs_findall)))
-            cols = row.findAll('td')
-            if len(cols) != 3:
-                continue
-            try:
-                moss_url = cols[0].find_all('a', href=True)[0]['href']
-            except:
-                stderr.write("Failed to parse row: %s" % row); continue
-            curr_filename1,curr_filename2 = [cols[i].find_all('a', href=True)[0].text.split('/')[-1].split()[0].strip() for i in [0,1]]
-            email1,email2 = [cols[i].find_all('a', href=True)[0].text.split('/')[-2] for i in [0,1]]
-            if email1 == email2:
-                continue # skip self-match
+    scheduler = Scheduler(max_concurrency=threads, rate=rate, retries=retries, metrics=metrics)
+    if cache is None:
+        fetcher = Fetcher(threads=threads, timeout=timeout, metrics=metrics, scheduler=scheduler)
+    else:
+        fetcher = Fetcher(threads=threads, timeout=timeout, cache=ResponseCache(cache, max_bytes=cache_size), metrics=metrics, scheduler=scheduler)
+    if journal is not None:
+        journal = MatchJournal(journal)
+    if spill is not None: # matches are staged on disk rather than in a 3D dictionary
+        from mossnet.spill import SPILL_MEMORY,SpillStore
+        store = SpillStore(spill, memory=(SPILL_MEMORY if spill_memory is None else spill_memory), metrics=metrics)
+    def iter_rows():
+        for url_num,url in enumerate(urls):
+            for row_num,row in enumerate(_parse_report(fetcher.stream(url), metrics=metrics)):
+                if row[1] == row[4]: # skip self-match
+                    metrics.count('self_matches_skipped'); continue
+                if max(row[3], row[6]) < min_percent:
+                    metrics.count('matches_below_min_percent'); continue
+                if base is not None and base.table.find_link(row[1], row[4], row[2], row[5]) is not None:
+                    metrics.count('matches_in_base'); continue
+                yield url_num, row_num, row
+
+    # parse reports as they stream in and download matches concurrently, but merge them in report order so the result matches a serial run
+    def fetch(row):
+        moss_url, email1, curr_filename1, percent1, email2, curr_filename2, percent2 = row
+        if lazy:
+            return percent1, None, percent2, None
+        if journal is None:
+            return _fetch_match(fetcher, moss_url, email1, email2)
+        match = journal.get(moss_url)
+        if match is None:
+            match = _fetch_match(fetcher, moss_url, email1, email2); journal.record(moss_url, match)
+        else:
+            metrics.count('journal_hits')
+        return match
+    links = dict(); num_matches = 0
+    try:
+        for (url_num, row_num, row), match in fetcher.map(lambda x: (x, fetch(x[2])), iter_rows()):
+            if verbose:
+                stderr.write("Parsing MOSS report %d of %d... Row %d\r" % (url_num+1, len(urls), row_num+1))
+            moss_url, email1, curr_filename1, percent1, email2, curr_filename2, percent2 = row
+            left_percent, left_html, right_percent, right_html = match; num_matches += 1
+            if spill is not None:
+                store.add(email1, email2, curr_filename1, curr_filename2, left_percent, left_html, right_percent, right_html, ((moss_url, 0) if lazy else None)); continue
+            if base is not None: # store HTML in base's BlobStore, so links can refer to it by ID
+                left_html = base.blobs.add(left_html); right_html = base.blobs.add(right_html)
             if email1 not in links:
                 links[email1] = dict()
             if email2 not in links[email1]:
@@ -52,16 +223,35 @@ def build(moss_results_links, verbose=False):
                 links[email2][email1] = dict()
             if (curr_filename1,curr_filename2) in links[email1][email2] or (curr_filename2,curr_filename1) in links[email2][email1]:
                 warn("Files '%s' and '%s' found for (%s, %s) multiple times. Taking latest version" % (curr_filename1, curr_filename2, email1, email2))
-            moss_url_base = '/'.join(moss_url.rstrip('/').split('/')[:-1])
-            main_html = urlopen(moss_url).read().decode()
-            if email1 not in main_html or email2 not in main_html:
-                raise RuntimeError("Didn't find the right email addresses in the match URL: %s" % moss_url)
-            top_url = '%s/%s' % (moss_url_base, main_html.split('<FRAME SRC=')[1].split(' ')[0].replace('"',''))
-            left_url = '%s/%s' % (moss_url_base, main_html.split('<FRAME SRC=')[2].split(' ')[0].replace('"',''))
-            right_url = '%s/%s' % (moss_url_base, main_html.split('<FRAME SRC=')[3].split(' ')[0].replace('"',''))
-            left_percent,right_percent = [int(part.split('(')[-1]) for part in urlopen(top_url).read().decode().split("%")[:2]]
-            left_html = sub(r'<(A|/A).*?>', "", urlopen(left_url).read().decode().split("<HR>")[1].split("</BODY>")[0].split("<PRE>")[1].split("</PRE>")[0].strip())
-            right_html = sub(r'<(A|/A).*?>', "", urlopen(right_url).read().decode().split("<HR>")[1].split("</BODY>")[0].split("<PRE>")[1].split("</PRE>")[0].strip())
-            links[email1][email2][(curr_filename1,curr_filename2)] = ((left_percent, left_html), (right_percent, right_html))
-            links[email2][email1][(curr_filename2,curr_filename1)] = ((right_percent, right_html), (left_percent, left_html))
-    return MossNet(links)
+            if lazy:
+                links[email1][email2][(curr_filename1,curr_filename2)] = ((left_percent, left_html), (right_percent, right_html), (moss_url, 0))
+                links[email2][email1][(curr_filename2,curr_filename1)] = ((right_percent, right_html), (left_percent, left_html), (moss_url, 1))
+            else:
+                links[email1][email2][(curr_filename1,curr_filename2)] = ((left_percent, left_html), (right_percent, right_html))
+                links[email2][email1][(curr_filename2,curr_filename1)] = ((right_percent, right_html), (left_percent, left_html))
+        if spill is not None:
+            spilled = store.close(fetcher=fetcher)
+    except BaseException:
+        if spill is not None: # don't leave the (possibly large) staging files behind
+            store.abort()
+        raise
+    finally: # also if a download or report fails, so an interrupted run's journal is closed (and can be resumed)
+        fetcher.close() # a lazily-built network keeps using it, opening new connections as needed
+        if journal is not None:
+            journal.close()
+    if verbose:
+        stderr.write("\n")
+    metrics.count('matches', num_matches)
+    if base is None:
+        net = spilled if spill is not None else MossNet(links, fetcher=fetcher, metrics=metrics, trusted=True) # links is symmetric and well-formed, so it's read in bulk
+    elif spill is not None: # base refers to the spilled HTML rather than holding a copy
+        table = spilled.table; blob_map = nparray([base.blobs.add_from(spilled.blobs, i) for i in range(len(spilled.blobs))], dtype=int64)
+        for field in ['u_blob', 'v_blob']:
+            ids = table.links[field]; has_id = (ids != NO_ID); ids[has_id] = blob_map[ids[has_id]]
+        net = base; net._extend(table)
+    else:
+        net = base; net._extend(MossNet(links, blobs=base.blobs, trusted=True).table)
+    if base is not None and net.fetcher is None: # lazily-built links are downloaded with this build's settings
+        net.fetcher = fetcher
+    metrics.record_stage('build', start, perf_counter()-start, num_matches)
+    return net
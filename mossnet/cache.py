@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+from collections import OrderedDict
+from hashlib import sha256
+from json import dumps,loads
+from os import listdir,makedirs,remove,replace,stat,utime
+from os.path import isdir,isfile
+from threading import Lock
+from time import time
+
+class ResponseCache:
+    def __init__(self, path, max_bytes=None):
+        '''Create (or open) an on-disk cache of downloaded pages, keyed by URL
+
+        Args:
+            ``path`` (``str``): Path to the cache folder (created if it doesn't exist)
+
+            ``max_bytes`` (``int``): The maximum total size of the cache (least-recently used pages are evicted first), or ``None`` for no limit
+
+        Returns:
+            ``ResponseCache``: A ``ResponseCache`` object
+        '''
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("'max_bytes' must be non-negative, but yours was %d" % max_bytes)
+        if isfile(path):
+            raise ValueError("Cache path exists and is not a folder: %s" % path)
+        if not isdir(path):
+            makedirs(path)
+        self.path = path; self.max_bytes = max_bytes; self.lock = Lock()
+        self.entries = OrderedDict() # key = filename; value = size; in order of last access (least-recently used first)
+        pages = list()
+        for fn in listdir(path):
+            if fn.endswith('.html'):
+                st = stat('%s/%s' % (path, fn)); pages.append((st.st_mtime, fn, st.st_size))
+        for t, fn, size in sorted(pages): # the order of previous runs' accesses is kept in the pages' modification times
+            self.entries[fn] = size
+        self.size = sum(self.entries.values())
+
+    def _filename(self, url):
+        return '%s.html' % sha256(url.encode()).hexdigest()
+
+    def get(self, url):
+        '''Return a cached page
+
+        Args:
+            ``url`` (``str``): The URL of the page
+
+        Returns:
+            ``str``: The (decoded) contents of the page, or ``None`` if it's not in the cache
+        '''
+        fn = self._filename(url)
+        with self.lock:
+            if fn not in self.entries:
+                return None
+            now = time(); self.entries.move_to_end(fn)
+        try:
+            f = open('%s/%s' % (self.path, fn), 'rb'); data = f.read(); f.close()
+            utime('%s/%s' % (self.path, fn), (now, now))
+        except FileNotFoundError: # evicted by another thread or process
+            return None
+        return data.decode()
+
+    def put(self, url, text):
+        '''Add a page to the cache, evicting least-recently used pages if the cache grows too large
+
+        Args:
+            ``url`` (``str``): The URL of the page
+
+            ``text`` (``str``): The (decoded) contents of the page
+        '''
+        fn = self._filename(url); data = text.encode()
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return
+        tmp = '%s/%s.tmp' % (self.path, fn)
+        f = open(tmp, 'wb'); f.write(data); f.close(); replace(tmp, '%s/%s' % (self.path, fn))
+        with self.lock:
+            if fn in self.entries:
+                self.size -= self.entries.pop(fn)
+            self.entries[fn] = len(data); self.size += len(data)
+            if self.max_bytes is not None:
+                while self.size > self.max_bytes:
+                    old, size = self.entries.popitem(last=False); self.size -= size
+                    try:
+                        remove('%s/%s' % (self.path, old))
+                    except FileNotFoundError:
+                        pass
+
+class MatchJournal:
+    def __init__(self, path):
+        '''Create (or open) an append-only checkpoint journal of downloaded MOSS matches
+
+        Args:
+            ``path`` (``str``): Path to the journal file (created if it doesn't exist)
+
+        Returns:
+            ``MatchJournal``: A ``MatchJournal`` object
+        '''
+        self.path = path; self.lock = Lock(); self.matches = dict() # key = match URL; value = (left_percent, left_html, right_percent, right_html)
+        lines = list()
+        if isfile(path):
+            f = open(path); lines = f.read().split('\n'); f.close()
+            for l in lines:
+                try:
+                    entry = loads(l)
+                except ValueError: # partially-written last line of an interrupted run
+                    continue
+                self.matches[entry['url']] = tuple(entry['match'])
+        self.file = open(path, 'a')
+        if len(lines) != 0 and len(lines[-1]) != 0:
+            self.file.write('\n') # terminate the partially-written last line
+
+    def get(self, moss_url):
+        '''Return a finished match
+
+        Args:
+            ``moss_url`` (``str``): The URL of the match
+
+        Returns:
+            ``tuple``: The ``(left_percent, left_html, right_percent, right_html)`` of the match, or ``None`` if it isn't in the journal
+        '''
+        return self.matches.get(moss_url, None)
+
+    def record(self, moss_url, match):
+        '''Record a finished match
+
+        Args:
+            ``moss_url`` (``str``): The URL of the match
+
+            ``match`` (``tuple``): The ``(left_percent, left_html, right_percent, right_html)`` of the match
+        '''
+        line = '%s\n' % dumps({'url':moss_url, 'match':match})
+        with self.lock:
+            self.matches[moss_url] = tuple(match); self.file.write(line); self.file.flush()
+
+    def close(self):
+        '''Close this journal'''
+        self.file.close()
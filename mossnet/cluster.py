@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+from mossnet.export import pair_counts
+from numpy import arange,argsort,array,flatnonzero,int64,searchsorted,unique
+
+class Dendrogram:
+    def __init__(self, table, min_percent=0):
+        '''Cluster the students of a ``LinkTable`` at every threshold at once: pairs are swept once in decreasing order of number of links,
+        merging the components of their students with an incremental union-find, so the clusters at any threshold (the connected components
+        of the pairs with at least that many links) are a prefix of the recorded merges
+
+        Args:
+            ``table`` (``LinkTable``): The links
+
+            ``min_percent`` (``int``): Only count links in which either file's percent similarity is at least ``min_percent``
+
+        Returns:
+            ``Dendrogram``: A ``Dendrogram`` object
+        '''
+        self.table = table; self.min_percent = min_percent
+        if min_percent <= 0:
+            counts = table.counts; order = table.sorted_pairs('descending')
+        else:
+            counts = pair_counts(table, min_percent); order = argsort(-counts, kind='stable')
+        order = order[counts[order] > 0]
+        parent = list(range(len(table.nodes))); size = [1]*len(table.nodes); merges = list()
+        for i, n, u, v in zip(order.tolist(), counts[order].tolist(), table.pair_u[order].tolist(), table.pair_v[order].tolist()):
+            ru = u
+            while parent[ru] != ru: # find (with path halving)
+                parent[ru] = parent[parent[ru]]; ru = parent[ru]
+            rv = v
+            while parent[rv] != rv:
+                parent[rv] = parent[parent[rv]]; rv = parent[rv]
+            if ru == rv:
+                continue
+            if size[ru] < size[rv]: # union by size
+                ru, rv = rv, ru
+            parent[rv] = ru; size[ru] += size[rv]; merges.append((n, i, rv, ru, size[ru]))
+        merges = array(merges, dtype=int64).reshape(-1, 5)
+        self.merge_links = merges[:,0]; self.merge_pairs = merges[:,1]; self.merge_child = merges[:,2]; self.merge_parent = merges[:,3]; self.merge_sizes = merges[:,4]
+
+    def __len__(self):
+        return len(self.merge_links)
+
+    def _num_merges(self, threshold):
+        '''Return the number of merges made by pairs with at least ``threshold`` links (merges are in decreasing order of number of links)'''
+        return int(searchsorted(-self.merge_links, -threshold, side='right'))
+
+    def labels(self, threshold):
+        '''Return the cluster of each student (in order of node ID) at ``threshold``, where a cluster is labeled by the node ID of one of its students
+
+        Args:
+            ``threshold`` (``int``): The minimum number of links of a pair for it to join its students' clusters
+
+        Returns:
+            ``ndarray``: The cluster label of each student
+        '''
+        k = self._num_merges(threshold); parent = arange(len(self.table.nodes), dtype=int64); parent[self.merge_child[:k]] = self.merge_parent[:k]
+        while True: # pointer jumping (union by size keeps the trees shallow)
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                return parent
+            parent = grandparent
+
+    def num_clusters(self, threshold, min_size=1):
+        '''Return the number of clusters with at least ``min_size`` students at ``threshold`` (see ``labels``)'''
+        if min_size <= 1:
+            return len(self.table.nodes) - self._num_merges(threshold)
+        return int((unique(self.labels(threshold), return_counts=True)[1] >= min_size).sum())
+
+    def clusters(self, threshold, min_size=2):
+        '''Return the clusters with at least ``min_size`` students at ``threshold`` (see ``labels``)
+
+        Args:
+            ``threshold`` (``int``): The minimum number of links of a pair for it to join its students' clusters
+
+            ``min_size`` (``int``): The minimum number of students of a cluster
+
+        Returns:
+            ``list`` of ``list``: The students of each cluster (in decreasing order of size)
+        '''
+        labels = self.labels(threshold); order = argsort(labels, kind='stable'); nodes = self.table.nodes
+        starts = flatnonzero(labels[order][1:] != labels[order][:-1]) + 1
+        bounds = [0] + starts.tolist() + [len(order)]
+        groups = [order[bounds[i]:bounds[i+1]] for i in range(len(bounds)-1) if bounds[i+1]-bounds[i] >= min_size]
+        groups.sort(key=lambda g: (-len(g), g[0]))
+        return [[nodes[u] for u in g.tolist()] for g in groups]
+
+    def thresholds(self):
+        '''Return the thresholds at which clusters merge, in decreasing order (the clusters only change at these thresholds)'''
+        return unique(self.merge_links)[::-1].tolist()
+
+    def merges(self):
+        '''Iterate over the merges in decreasing order of threshold: ``(threshold, u, v, size)`` means that at ``threshold``, the pair ``u``, ``v``
+        (with ``threshold`` links) joined their students' clusters into one of ``size`` students. These pairs form a maximum spanning forest'''
+        nodes = self.table.nodes; t = self.table
+        for n, u, v, size in zip(self.merge_links.tolist(), t.pair_u[self.merge_pairs].tolist(), t.pair_v[self.merge_pairs].tolist(), self.merge_sizes.tolist()):
+            yield n, nodes[u], nodes[v], size
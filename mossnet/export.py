@@ -0,0 +1,281 @@
+#! /usr/bin/env python
+from mossnet.table import NO_ID
+from csv import writer
+from json import dumps
+from numpy import add,arange,array,concatenate,empty,flatnonzero,int64,linspace,maximum,minimum,save,searchsorted,zeros
+from numpy.lib.format import open_memmap
+from os import makedirs
+
+BUFFER_SIZE = 1048576 # bytes of output buffered between writes
+CHUNK_SIZE = 10000 # number of nodes/edges formatted at a time
+REDS = [(1.0, 0.9607843137254902, 0.9411764705882353), (0.996078431372549, 0.8784313725490196, 0.8235294117647058), (0.9882352941176471, 0.7333333333333333, 0.6313725490196078), (0.9882352941176471, 0.5725490196078431, 0.4470588235294118), (0.984313725490196, 0.41568627450980394, 0.2901960784313726), (0.9372549019607843, 0.23137254901960785, 0.17254901960784313), (0.796078431372549, 0.09411764705882353, 0.11372549019607843), (0.6470588235294118, 0.058823529411764705, 0.08235294117647059), (0.403921568627451, 0.0, 0.05098039215686274)] # ColorBrewer "Reds" (#FFF5F0 to #67000D) as in matplotlib
+XML_ESCAPES = [('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;')]
+LINK_FIELDS = ['u', 'v', 'u_file', 'v_file', 'u_percent', 'v_percent'] # fields of each exported link (followed by 'u_html' and 'v_html' if HTML is exported)
+
+def reds_palette(n):
+    '''Return ``n`` evenly-spaced colors (as ``(r, g, b)`` tuples in [0, 1]) of the "Reds" colormap, excluding its endpoints,
+    sampled from a 256-color lookup table the way ``seaborn.color_palette("Reds", n)`` does'''
+    stops = array(REDS)
+    x = 255*linspace(0, 1, len(REDS)); x_lut = 255*linspace(0, 1, 256) # interpolate exactly as matplotlib does, so colors truncate to the same integers
+    ind = searchsorted(x, x_lut)[1:-1]; distance = ((x_lut[1:-1] - x[ind-1]) / (x[ind] - x[ind-1]))[:,None]
+    lut = concatenate((stops[:1], distance*(stops[ind] - stops[ind-1]) + stops[ind-1], stops[-1:]))
+    return [tuple(c) for c in lut[minimum((linspace(0, 1, n+2)[1:-1]*256).astype(int), 255)].tolist()]
+
+def pair_counts(table, min_percent=0):
+    '''Return the number of links of each pair of a ``LinkTable``, counting only links in which either file's percent similarity is at least ``min_percent``
+
+    Args:
+        ``table`` (``LinkTable``): The links
+
+        ``min_percent`` (``int``): The minimum percent similarity of a link to be counted
+
+    Returns:
+        ``ndarray``: The number of (counted) links of each pair
+    '''
+    if min_percent <= 0 or table.num_pairs() == 0:
+        return table.counts
+    counted = (maximum(table.links['u_percent'], table.links['v_percent']) >= min_percent).astype(int64)
+    return add.reduceat(counted, table.offsets[:-1]) # every pair has at least one link, so no segment is empty
+
+def select_pairs(table, gte=0, min_percent=0):
+    '''Return the indices (in pair order) and numbers of links of the pairs to export, in one pass without sorting
+
+    Args:
+        ``table`` (``LinkTable``): The links
+
+        ``gte`` (``int``): The minimum number of (counted) links of a pair to be exported
+
+        ``min_percent`` (``int``): The minimum percent similarity of a link to be counted (see ``pair_counts``)
+
+    Returns:
+        ``tuple``: The ``ndarray`` of indices of the selected pairs, and the ``ndarray`` of numbers of links of every pair
+    '''
+    counts = pair_counts(table, min_percent)
+    return flatnonzero(counts >= max(gte, 1)), counts
+
+def _xml_escape(text):
+    for c, escaped in XML_ESCAPES:
+        text = text.replace(c, escaped)
+    return text
+
+def _chunks(table, pairs, counts):
+    '''Iterate over the selected pairs in pieces of (at most) ``CHUNK_SIZE``, as ``(first edge number, us, vs, numbers of links)`` lists'''
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        chunk = pairs[start:start+CHUNK_SIZE]
+        yield start, table.pair_u[chunk].tolist(), table.pair_v[chunk].tolist(), counts[chunk].tolist()
+
+def write_dot(table, outpath, pairs, counts):
+    '''Write the selected pairs (see ``select_pairs``) of a ``LinkTable`` as a GraphViz DOT file, with edges colored by number of links
+
+    Returns:
+        ``int``: The number of edges written
+    '''
+    pal = [('#%02x%02x%02x' % tuple(round(255*x) for x in c)).upper() for c in reds_palette(int(counts.max()) if len(counts) != 0 else 0)]
+    f = open(outpath, 'w', buffering=BUFFER_SIZE); f.write("graph G {\n")
+    for start in range(0, len(table.nodes), CHUNK_SIZE):
+        f.write(''.join('  node%d[label="%s"]\n' % (i, u.replace('"', '\\"')) for i,u in enumerate(table.nodes[start:start+CHUNK_SIZE], start=start)))
+    for _, us, vs, ns in _chunks(table, pairs, counts):
+        f.write(''.join('  node%d -- node%d[color="%s"]\n' % (u, v, pal[n-1]) for u,v,n in zip(us, vs, ns)))
+    f.write('}\n'); f.close()
+    return len(pairs)
+
+def write_gexf(table, outpath, pairs, counts):
+    '''Write the selected pairs (see ``select_pairs``) of a ``LinkTable`` as a Graph Exchange XML Format (GEXF) file, with edges colored and weighted by number of links
+
+    Returns:
+        ``int``: The number of edges written
+    '''
+    from datetime import datetime
+    pal = [(int(255*c[0]), int(255*c[1]), int(255*c[2])) for c in reds_palette(int(counts.max()) if len(counts) != 0 else 0)]
+    f = open(outpath, 'w', buffering=BUFFER_SIZE)
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write('<gexf xmlns="http://www.gexf.net/1.3draft" xmlns:viz="http://www.gexf.net/1.3draft/viz">\n')
+    f.write('  <meta lastmodifieddate="%s">\n' % datetime.today().strftime('%Y-%m-%d'))
+    f.write('    <creator>MossNet</creator>\n')
+    f.write('    <description>A MossNet network exported to GEXF</description>\n')
+    f.write('  </meta>\n')
+    f.write('  <graph mode="static" defaultedgetype="undirected">\n')
+    f.write('    <nodes>\n')
+    for start in range(0, len(table.nodes), CHUNK_SIZE):
+        f.write(''.join('      <node id="%d" label="%s"/>\n' % (i, _xml_escape(u)) for i,u in enumerate(table.nodes[start:start+CHUNK_SIZE], start=start)))
+    f.write('    </nodes>\n')
+    f.write('    <edges>\n')
+    for start, us, vs, ns in _chunks(table, pairs, counts):
+        f.write(''.join('      <edge id="%d" source="%d" target="%d" weight="%d">\n        <viz:color r="%d" g="%d" b="%d"/>\n      </edge>\n' % ((i, u, v, n) + pal[n-1]) for i,u,v,n in zip(range(start, start+len(us)), us, vs, ns)))
+    f.write('    </edges>\n')
+    f.write('  </graph>\n')
+    f.write('</gexf>\n'); f.close()
+    return len(pairs)
+
+def write_graphml(table, outpath, pairs, counts):
+    '''Write the selected pairs (see ``select_pairs``) of a ``LinkTable`` as a GraphML file, with node labels and edge numbers of links
+
+    Returns:
+        ``int``: The number of edges written
+    '''
+    f = open(outpath, 'w', buffering=BUFFER_SIZE)
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n')
+    f.write('  <key id="label" for="node" attr.name="label" attr.type="string"/>\n')
+    f.write('  <key id="links" for="edge" attr.name="links" attr.type="int"/>\n')
+    f.write('  <graph id="G" edgedefault="undirected">\n')
+    for start in range(0, len(table.nodes), CHUNK_SIZE):
+        f.write(''.join('    <node id="n%d"><data key="label">%s</data></node>\n' % (i, _xml_escape(u)) for i,u in enumerate(table.nodes[start:start+CHUNK_SIZE], start=start)))
+    for start, us, vs, ns in _chunks(table, pairs, counts):
+        f.write(''.join('    <edge id="e%d" source="n%d" target="n%d"><data key="links">%d</data></edge>\n' % (i, u, v, n) for i,u,v,n in zip(range(start, start+len(us)), us, vs, ns)))
+    f.write('  </graph>\n')
+    f.write('</graphml>\n'); f.close()
+    return len(pairs)
+
+def write_csv(table, outpath, pairs, counts):
+    '''Write the selected pairs (see ``select_pairs``) of a ``LinkTable`` as a CSV edge list with columns ``u``, ``v``, and ``links``
+
+    Returns:
+        ``int``: The number of edges written
+    '''
+    f = open(outpath, 'w', newline='', buffering=BUFFER_SIZE); out = writer(f); out.writerow(['u', 'v', 'links']); nodes = table.nodes
+    for _, us, vs, ns in _chunks(table, pairs, counts):
+        out.writerows([nodes[u], nodes[v], n] for u,v,n in zip(us, vs, ns))
+    f.close()
+    return len(pairs)
+
+WRITERS = {'csv':write_csv, 'dot':write_dot, 'gexf':write_gexf, 'graphml':write_graphml}
+
+def export_graph(table, outpath, style, gte=0, min_percent=0):
+    '''Export the network of a ``LinkTable`` as a graph file in one streaming pass over its pairs (in pair order, without sorting)
+
+    Args:
+        ``table`` (``LinkTable``): The links
+
+        ``outpath`` (``str``): Path to the desired output file
+
+        ``style`` (``str``): The file format (``"csv"``, ``"dot"``, ``"gexf"``, or ``"graphml"``)
+
+        ``gte`` (``int``): The minimum number of links of a pair for its edge to be exported
+
+        ``min_percent`` (``int``): Only count links in which either file's percent similarity is at least ``min_percent``
+
+    Returns:
+        ``int``: The number of edges written
+    '''
+    if style not in WRITERS:
+        raise ValueError("Invalid graph export style: %s" % style)
+    pairs, counts = select_pairs(table, gte=gte, min_percent=min_percent)
+    return WRITERS[style](table, outpath, pairs, counts)
+
+def link_chunks(table, gte=0, min_percent=0):
+    '''Iterate over the links of the selected pairs (see ``select_pairs``) that are counted (see ``pair_counts``), in pair order,
+    in pieces of (at most) ``CHUNK_SIZE`` links, as ``(pair index of each link, links)`` arrays (views of the table where possible)'''
+    pairs, counts = select_pairs(table, gte=gte, min_percent=min_percent)
+    selected = zeros(table.num_pairs(), dtype=bool); selected[pairs] = True
+    for start in range(0, len(table.links), CHUNK_SIZE):
+        links = table.links[start:start+CHUNK_SIZE]; link_pairs = searchsorted(table.offsets, arange(start, start+len(links)), side='right') - 1
+        keep = selected[link_pairs]
+        if min_percent > 0:
+            keep &= (maximum(links['u_percent'], links['v_percent']) >= min_percent)
+        if not keep.all():
+            links = links[keep]; link_pairs = link_pairs[keep]
+        if len(links) != 0:
+            yield link_pairs, links
+
+def num_exported_links(table, gte=0, min_percent=0):
+    '''Return the number of links ``link_chunks`` iterates over (without iterating)'''
+    pairs, counts = select_pairs(table, gte=gte, min_percent=min_percent)
+    return int(counts[pairs].sum())
+
+def write_jsonl(table, blobs, outpath, gte=0, min_percent=0, html=True):
+    '''Write the links (see ``link_chunks``) of a ``LinkTable`` as a JSON Lines file: one object per link, with fields ``LINK_FIELDS``
+    (and ``u_html`` and ``v_html`` if ``html``, ``null`` if it wasn't downloaded)
+
+    Returns:
+        ``int``: The number of links written
+    '''
+    nodes = [dumps(u) for u in table.nodes]; files = [dumps(f) for f in table.files]; num_links = 0 # labels are escaped once, not once per link
+    f = open(outpath, 'w', buffering=BUFFER_SIZE)
+    for link_pairs, links in link_chunks(table, gte=gte, min_percent=min_percent):
+        rows = zip(table.pair_u[link_pairs].tolist(), table.pair_v[link_pairs].tolist(), links['u_file'].tolist(), links['v_file'].tolist(), links['u_percent'].tolist(), links['v_percent'].tolist())
+        if html:
+            html_of = lambda b: 'null' if b == NO_ID else dumps(blobs.get(b))
+            f.write(''.join('{"u": %s, "v": %s, "u_file": %s, "v_file": %s, "u_percent": %d, "v_percent": %d, "u_html": %s, "v_html": %s}\n' % (nodes[u], nodes[v], files[u_file], files[v_file], u_percent, v_percent, html_of(u_blob), html_of(v_blob))
+                            for (u, v, u_file, v_file, u_percent, v_percent), u_blob, v_blob in zip(rows, links['u_blob'].tolist(), links['v_blob'].tolist())))
+        else:
+            f.write(''.join('{"u": %s, "v": %s, "u_file": %s, "v_file": %s, "u_percent": %d, "v_percent": %d}\n' % (nodes[u], nodes[v], files[u_file], files[v_file], u_percent, v_percent) for u, v, u_file, v_file, u_percent, v_percent in rows))
+        num_links += len(links)
+    f.close()
+    return num_links
+
+def _column(path, dtype, n):
+    '''Create a ``.npy`` file of ``n`` values of type ``dtype``, memory-mapped so it can be filled in pieces'''
+    if n == 0: # an empty file can't be memory-mapped
+        save(path, empty(0, dtype=dtype)); return empty(0, dtype=dtype)
+    return open_memmap(path, mode='w+', dtype=dtype, shape=(n,))
+
+def write_columns(table, blobs, outpath, gte=0, min_percent=0, html=True):
+    '''Write the links (see ``link_chunks``) of a ``LinkTable`` as a folder of columns: ``links.csv`` (with columns ``LINK_FIELDS``, and ``u_html`` and ``v_html`` if ``html``),
+    and the same columns as NumPy arrays: ``nodes.txt`` and ``files.txt`` (one label per line), ``u.npy``, ``v.npy`` (node IDs), ``u_file.npy``, ``v_file.npy`` (file IDs),
+    and ``u_percent.npy``, ``v_percent.npy``. If ``html``, also ``u_html.npy`` and ``v_html.npy`` (HTML IDs, -1 if it wasn't downloaded): the HTML of ID ``i`` is
+    bytes ``html_offsets[i]`` to ``html_offsets[i+1]`` of ``html.bin`` (UTF-8)
+
+    Returns:
+        ``int``: The number of links written
+    '''
+    makedirs(outpath); n = num_exported_links(table, gte=gte, min_percent=min_percent); nodes = table.nodes; file_labels = table.files
+    for name, labels in [('nodes', table.nodes), ('files', table.files)]:
+        f = open('%s/%s.txt' % (outpath, name), 'w', buffering=BUFFER_SIZE); f.write(''.join('%s\n' % x for x in labels)); f.close()
+    names = ['u', 'v', 'u_file', 'v_file', 'u_percent', 'v_percent'] + (['u_html', 'v_html'] if html else list())
+    columns = {name:_column('%s/%s.npy' % (outpath, name), (table.links['u_percent'].dtype if name.endswith('percent') else int64), n) for name in names}
+    f = open('%s/links.csv' % outpath, 'w', newline='', buffering=BUFFER_SIZE); out = writer(f); out.writerow(LINK_FIELDS + (['u_html', 'v_html'] if html else list()))
+    start = 0
+    for link_pairs, links in link_chunks(table, gte=gte, min_percent=min_percent):
+        end = start + len(links); us = table.pair_u[link_pairs]; vs = table.pair_v[link_pairs]
+        for name, values in [('u', us), ('v', vs), ('u_file', links['u_file']), ('v_file', links['v_file']), ('u_percent', links['u_percent']), ('v_percent', links['v_percent'])]:
+            columns[name][start:end] = values
+        rows = zip(us.tolist(), vs.tolist(), links['u_file'].tolist(), links['v_file'].tolist(), links['u_percent'].tolist(), links['v_percent'].tolist())
+        if html:
+            columns['u_html'][start:end] = links['u_blob']; columns['v_html'][start:end] = links['v_blob']
+            html_of = lambda b: '' if b == NO_ID else blobs.get(b)
+            out.writerows([nodes[u], nodes[v], file_labels[u_file], file_labels[v_file], u_percent, v_percent, html_of(u_blob), html_of(v_blob)] for (u, v, u_file, v_file, u_percent, v_percent), u_blob, v_blob in zip(rows, links['u_blob'].tolist(), links['v_blob'].tolist()))
+        else:
+            out.writerows([nodes[u], nodes[v], file_labels[u_file], file_labels[v_file], u_percent, v_percent] for u, v, u_file, v_file, u_percent, v_percent in rows)
+        start = end
+    f.close()
+    for column in columns.values():
+        if hasattr(column, 'flush'):
+            column.flush()
+    del columns
+    if html: # every distinct HTML string, once
+        offsets = _column('%s/html_offsets.npy' % outpath, int64, len(blobs)+1); f = open('%s/html.bin' % outpath, 'wb', buffering=BUFFER_SIZE); offset = 0
+        for start in range(0, len(blobs), CHUNK_SIZE):
+            data = [blobs.get(i).encode() for i in range(start, min(start+CHUNK_SIZE, len(blobs)))]; f.write(b''.join(data))
+            lengths = array([len(d) for d in data], dtype=int64); offsets[start] = offset; offsets[start+1:start+1+len(data)] = offset + lengths.cumsum(); offset = int(offsets[start+len(data)])
+        f.close()
+        if hasattr(offsets, 'flush'):
+            offsets.flush()
+    return n
+
+LINK_WRITERS = {'columns':write_columns, 'jsonl':write_jsonl}
+
+def export_links(table, blobs, outpath, style, gte=0, min_percent=0, html=True):
+    '''Export the links of a ``LinkTable`` (one record per link, see ``LINK_FIELDS``) in one buffered streaming pass over the links (in pair order)
+
+    Args:
+        ``table`` (``LinkTable``): The links
+
+        ``blobs`` (``BlobStore``): The HTML of the links
+
+        ``outpath`` (``str``): Path to the desired output file (``"jsonl"``) or folder (``"columns"``)
+
+        ``style`` (``str``): The format (``"jsonl"`` or ``"columns"``)
+
+        ``gte`` (``int``): Only export links of pairs with at least ``gte`` (counted) links
+
+        ``min_percent`` (``int``): Only export (and count) links in which either file's percent similarity is at least ``min_percent``
+
+        ``html`` (``bool``): ``True`` to also export the HTML of each link, otherwise ``False``
+
+    Returns:
+        ``int``: The number of links written
+    '''
+    if style not in LINK_WRITERS:
+        raise ValueError("Invalid link export style: %s" % style)
+    return LINK_WRITERS[style](table, blobs, outpath, gte=gte, min_percent=min_percent, html=html)
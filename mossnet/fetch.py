@@ -0,0 +1,206 @@
+#! /usr/bin/env python
+from mossnet.metrics import NULL_METRICS
+from mossnet.schedule import Scheduler
+from codecs import getincrementaldecoder
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection,HTTPException,HTTPSConnection
+from threading import Lock,local
+from time import perf_counter
+from urllib.error import HTTPError
+from urllib.parse import urljoin,urlsplit
+
+CHUNK_SIZE = 65536
+MAX_REDIRECTS = 5
+MAP_WINDOW = 4 # maximum number of items in flight (or finished but not yet consumed) per thread in Fetcher.map, so results don't pile up in memory
+
+class Fetcher:
+    def __init__(self, threads=1, timeout=None, cache=None, metrics=None, scheduler=None):
+        '''Create a ``Fetcher`` that downloads pages, reusing one keep-alive connection per host per thread (until ``close`` is called)
+
+        Args:
+            ``threads`` (``int``): The maximum number of concurrent downloads
+
+            ``timeout`` (``float``): Socket timeout (in seconds) of each connection, or ``None`` for no timeout
+
+            ``cache`` (``ResponseCache``): A cache of previously-downloaded pages, or ``None`` to not cache
+
+            ``metrics`` (``Metrics``): A ``Metrics`` object in which to record every download, or ``None`` to not record
+
+            ``scheduler`` (``Scheduler``): The ``Scheduler`` that paces downloads and retries transient errors, or ``None`` for one that allows up to ``threads``
+            concurrent downloads (adapting to congestion) and retries with its default backoff
+
+        Returns:
+            ``Fetcher``: A ``Fetcher`` object
+        '''
+        if not isinstance(threads, int):
+            raise TypeError("'threads' must be an 'int', but you provided a '%s'" % type(threads).__name__)
+        if threads < 1:
+            raise ValueError("'threads' must be positive, but yours was %d" % threads)
+        self.threads = threads; self.timeout = timeout; self.cache = cache; self._local = local()
+        self._conns = list(); self._conns_lock = Lock() # every kept-alive connection of every thread, so close() can close them
+        self.metrics = NULL_METRICS if metrics is None else metrics
+        self.scheduler = Scheduler(max_concurrency=threads, metrics=self.metrics) if scheduler is None else scheduler
+
+    def _connection(self, scheme, netloc, fresh=False):
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = dict(); self._local.conns = conns
+        key = (scheme, netloc)
+        if fresh and key in conns:
+            conn = conns.pop(key); conn.close()
+            with self._conns_lock:
+                self._conns.remove(conn)
+        if key not in conns:
+            conns[key] = self._new_connection(scheme, netloc)
+            with self._conns_lock:
+                self._conns.append(conns[key])
+        return conns[key]
+
+    def _new_connection(self, scheme, netloc):
+        if scheme == 'https':
+            return HTTPSConnection(netloc, timeout=self.timeout)
+        return HTTPConnection(netloc, timeout=self.timeout)
+
+    def close(self):
+        '''Close the kept-alive connections of every thread (this ``Fetcher`` can still be used afterwards, e.g. for lazy downloads, opening new ones)'''
+        with self._conns_lock:
+            conns = self._conns; self._conns = list(); self._local = local()
+        for conn in conns:
+            conn.close()
+
+    def _open(self, url, pooled=True):
+        '''Send a GET request (following redirects), and return the ``(connection, response)`` with the body unread.
+        If not ``pooled``, the request is sent on a new connection of its own (which the caller must close), rather than on this thread's kept-alive one'''
+        for _ in range(MAX_REDIRECTS+1):
+            parts = urlsplit(url); path = parts.path or '/'
+            if parts.query:
+                path = '%s?%s' % (path, parts.query)
+            for attempt in range(2): # a kept-alive connection may have been closed by the server, so retry once on a fresh one
+                if pooled:
+                    conn = self._connection(parts.scheme, parts.netloc, fresh=(attempt != 0))
+                else:
+                    conn = self._new_connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request('GET', path); resp = conn.getresponse()
+                    break
+                except (HTTPException, ConnectionError):
+                    conn.close()
+                    if attempt != 0:
+                        raise
+            if resp.status in {301, 302, 303, 307, 308} and resp.getheader('Location') is not None:
+                resp.read()
+                if resp.will_close or not pooled:
+                    conn.close()
+                url = urljoin(url, resp.getheader('Location')); continue
+            if resp.status >= 400:
+                resp.read()
+                if resp.will_close or not pooled:
+                    conn.close()
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            return conn, resp
+        raise RuntimeError("Too many redirects: %s" % url)
+
+    def stream(self, url, chunk_size=CHUNK_SIZE):
+        '''Download a page incrementally (if a transient error occurs before any of the page is yielded, the download is retried)
+
+        Args:
+            ``url`` (``str``): The URL of the page
+
+            ``chunk_size`` (``int``): The number of bytes to read at a time
+
+        Yields:
+            ``str``: Consecutive (decoded) pieces of the page
+        '''
+        return self._download(url, chunk_size, whole=False)
+
+    def get(self, url):
+        '''Download a page (retrying transient errors, see ``Scheduler``)
+
+        Args:
+            ``url`` (``str``): The URL of the page
+
+        Returns:
+            ``str``: The (decoded) contents of the page
+        '''
+        return ''.join(self._download(url, CHUNK_SIZE, whole=True))
+
+    def _download(self, url, chunk_size, whole):
+        '''Download a page, yielding it in pieces (or, if ``whole``, all at once, so errors anywhere in the page can be retried)'''
+        start = perf_counter() if self.metrics else None
+        if self.cache is not None:
+            text = self.cache.get(url)
+            if text is not None:
+                if self.metrics:
+                    self.metrics.record_request(url, start, perf_counter()-start, 0, cached=True) # nothing was downloaded
+                yield text; return
+        scheme = urlsplit(url).scheme; host = urlsplit(url).netloc; attempt = 0
+        while True:
+            self.scheduler.acquire(host); t = perf_counter(); latency = None; conn = None; resp = None
+            pieces = list(); yielded = False; done = False; released = False; num_bytes = 0
+            try:
+                if scheme in {'http', 'https'}: # a stream's consumer may download other pages from the same host mid-stream (e.g. a report's matches), so it gets its own connection
+                    conn, resp = self._open(url, pooled=whole)
+                else: # e.g. file:// URLs
+                    from urllib.request import urlopen
+                    resp = urlopen(url, timeout=self.timeout)
+                latency = perf_counter()-t; decoder = getincrementaldecoder('utf-8')()
+                if not whole: # the consumer of a stream may hold it open for a long time (e.g. while downloading its matches), so it only holds a slot until the response arrives
+                    released = True; self.scheduler.release(host, latency)
+                while True:
+                    data = resp.read(chunk_size); num_bytes += len(data)
+                    text = decoder.decode(data, final=(len(data) == 0))
+                    if whole or self.cache is not None:
+                        pieces.append(text)
+                    if not whole and len(text) != 0:
+                        yielded = True; yield text
+                    if len(data) == 0:
+                        break
+                done = True
+            except BaseException as e: # including the consumer closing this generator
+                failed = isinstance(e, Exception)
+                if not released:
+                    self.scheduler.release(host, perf_counter()-t if latency is None else latency, e if failed else None)
+                if not failed or yielded or not self.scheduler.retry(attempt, e):
+                    raise
+                attempt += 1; continue
+            finally:
+                if conn is None:
+                    if resp is not None:
+                        resp.close()
+                elif not done or resp.will_close or not whole: # a partially-read response can't be reused, and a stream's connection isn't pooled
+                    conn.close()
+            if not released:
+                self.scheduler.release(host, latency)
+            break
+        if self.metrics:
+            self.metrics.record_request(url, start, perf_counter()-start, num_bytes)
+        if self.cache is not None:
+            self.cache.put(url, ''.join(pieces))
+        if whole:
+            yield ''.join(pieces)
+
+    def map(self, func, items):
+        '''Apply ``func`` to each item of ``items`` using up to ``threads`` concurrent workers
+
+        Args:
+            ``func`` (``function``): The function to apply
+
+            ``items`` (iterable): The items to apply ``func`` to
+
+        Returns:
+            iterator: The results of ``func``, in the same order as ``items`` (at most ``MAP_WINDOW`` items per thread are read ahead of the results consumed)
+        '''
+        if self.threads == 1:
+            return map(func, items)
+        return self._map(func, items)
+
+    def _map(self, func, items):
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            window = deque()
+            for item in items:
+                window.append(pool.submit(func, item))
+                if len(window) >= MAP_WINDOW*self.threads:
+                    yield window.popleft().result()
+            while len(window) != 0:
+                yield window.popleft().result()
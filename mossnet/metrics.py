@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+from json import dump
+from math import ceil,log2
+from os import getpid
+from threading import Lock,get_ident
+from time import perf_counter
+
+MAX_EVENTS = 1000000 # at most this many trace events are kept (later stages/requests are still aggregated, just not traced)
+
+class _Stage:
+    '''A running stage (see ``Metrics.stage``), whose ``items`` can be set to report the stage's throughput'''
+    def __init__(self, metrics, name):
+        self.metrics = metrics; self.name = name; self.items = None
+
+    def __enter__(self):
+        self.start = perf_counter(); return self
+
+    def __exit__(self, *exc):
+        self.metrics.record_stage(self.name, self.start, perf_counter()-self.start, self.items)
+
+class Metrics:
+    def __init__(self, trace=True):
+        '''Create a ``Metrics`` object, which records per-stage timings, counters, and HTTP requests (count, bytes, and latency histogram)
+        of anything it's given to (e.g. ``build(metrics=...)``, ``load(metrics=...)``, or ``MossNet(metrics=...)``). It is thread-safe
+
+        Args:
+            ``trace`` (``bool``): ``True`` to also keep every stage and request as a trace event (see ``write_trace``), otherwise ``False``
+
+        Returns:
+            ``Metrics``: A ``Metrics`` object
+        '''
+        self.trace = trace; self.lock = Lock(); self.origin = perf_counter(); self.pid = getpid()
+        self.stages = dict() # key = stage name; value = [calls, total seconds, max seconds, items]
+        self.counters = dict(); self.events = list()
+        self.requests = 0; self.cache_hits = 0; self.bytes_downloaded = 0; self.latency = 0.
+        self.histogram = dict() # key = upper bound of a latency bucket (ms, a power of 2); value = number of requests
+
+    def __bool__(self):
+        return True
+
+    def stage(self, name):
+        '''Time a stage, e.g. ``with metrics.stage('parse') as s: ...`` (set ``s.items`` to record the number of items it processed)
+
+        Args:
+            ``name`` (``str``): The name of the stage (timings of stages with the same name are aggregated)
+        '''
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        '''Add ``n`` to the counter ``name``'''
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_stage(self, name, start, seconds, items=None):
+        '''Record a finished stage that started at ``start`` (a ``perf_counter`` time) and took ``seconds``'''
+        with self.lock:
+            s = self.stages.get(name, None)
+            if s is None:
+                s = [0, 0., 0., 0]; self.stages[name] = s
+            s[0] += 1; s[1] += seconds; s[2] = max(s[2], seconds)
+            if items is not None:
+                s[3] += items
+            if self.trace and len(self.events) < MAX_EVENTS:
+                self.events.append((name, 'stage', start, seconds, get_ident(), None if items is None else {'items':items}))
+
+    def record_request(self, url, start, seconds, num_bytes, cached=False):
+        '''Record a downloaded page of ``num_bytes`` bytes, whose download started at ``start`` (a ``perf_counter`` time) and took ``seconds``'''
+        bucket = 2**max(0, ceil(log2(max(1000*seconds, 1e-9))))
+        with self.lock:
+            self.requests += 1; self.bytes_downloaded += num_bytes; self.latency += seconds
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+            if cached:
+                self.cache_hits += 1
+            if self.trace and len(self.events) < MAX_EVENTS:
+                self.events.append(('GET', 'request', start, seconds, get_ident(), {'url':url, 'bytes':num_bytes, 'cached':cached}))
+
+    def as_dict(self):
+        '''Return the recorded metrics as a JSON-serializable ``dict``'''
+        with self.lock:
+            stages = {name:{'calls':calls, 'seconds':total, 'max_seconds':longest, 'items':items, 'items_per_second':(items/total if total > 0 else None)} for name,(calls,total,longest,items) in self.stages.items()}
+            return {'stages':stages, 'counters':dict(self.counters), 'requests':self.requests, 'cache_hits':self.cache_hits, 'bytes_downloaded':self.bytes_downloaded,
+                    'mean_latency':(self.latency/self.requests if self.requests != 0 else None), 'latency_histogram_ms':{str(b):n for b,n in sorted(self.histogram.items())}}
+
+    def summary(self):
+        '''Return a human-readable summary of the recorded metrics
+
+        Returns:
+            ``str``: The summary
+        '''
+        d = self.as_dict(); lines = ['%-24s %8s %12s %12s %12s %14s' % ('Stage', 'Calls', 'Total (s)', 'Mean (ms)', 'Max (ms)', 'Items/second')]
+        for name, s in sorted(d['stages'].items(), key=lambda x: -x[1]['seconds']):
+            rate = '' if s['items'] == 0 or s['items_per_second'] is None else '%.1f' % s['items_per_second']
+            lines.append('%-24s %8d %12.3f %12.3f %12.3f %14s' % (name, s['calls'], s['seconds'], 1000*s['seconds']/s['calls'], 1000*s['max_seconds'], rate))
+        if d['requests'] != 0:
+            lines.append('Requests: %d (%d from cache), %.1f MB downloaded, mean latency %.1f ms' % (d['requests'], d['cache_hits'], d['bytes_downloaded']/1e6, 1000*d['mean_latency']))
+            lines.append('Latency histogram:')
+            for bucket, n in sorted(self.histogram.items()):
+                lines.append('  <= %6d ms: %d' % (bucket, n))
+        if len(d['counters']) != 0:
+            lines.append('Counters:')
+            for name, n in sorted(d['counters'].items()):
+                lines.append('  %s: %d' % (name, n))
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        '''Write the trace events as a Chrome Trace Event Format JSON file (viewable in ``chrome://tracing`` or Perfetto)
+
+        Args:
+            ``path`` (``str``): The desired output file's path
+        '''
+        with self.lock:
+            events = [{'name':name, 'cat':cat, 'ph':'X', 'ts':1e6*(start-self.origin), 'dur':1e6*seconds, 'pid':self.pid, 'tid':tid, 'args':(args or dict())} for name, cat, start, seconds, tid, args in self.events]
+        f = open(path, 'w'); dump({'traceEvents':events, 'displayTimeUnit':'ms'}, f); f.close()
+
+class _NullStage:
+    items = None
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        pass
+
+class NullMetrics:
+    '''A ``Metrics`` stand-in that records nothing (used when no ``Metrics`` object is given, so instrumentation costs almost nothing)'''
+    _stage = _NullStage()
+
+    def __bool__(self):
+        return False
+
+    def stage(self, name):
+        return self._stage
+
+    def count(self, name, n=1):
+        pass
+
+    def record_stage(self, name, start, seconds, items=None):
+        pass
+
+    def record_request(self, url, start, seconds, num_bytes, cached=False):
+        pass
+
+NULL_METRICS = NullMetrics()
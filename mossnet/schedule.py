@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+from mossnet.metrics import NULL_METRICS
+from http.client import HTTPException
+from random import Random
+from threading import Condition,Lock
+from time import perf_counter,sleep
+from urllib.error import HTTPError,URLError
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504} # HTTP statuses worth retrying (timeouts, throttling, and server errors)
+LATENCY_SLACK = 0.1 # seconds of latency above LATENCY_FACTOR times the baseline that are still not considered congestion (absorbs jitter of fast servers)
+
+def is_transient(error):
+    '''Return ``True`` if a download that raised ``error`` may succeed if retried (e.g. a timeout, reset connection, or HTTP 429/503), otherwise ``False``'''
+    if isinstance(error, HTTPError):
+        return error.code in TRANSIENT_STATUS
+    if isinstance(error, URLError): # e.g. connection refused while opening a non-HTTP URL
+        return isinstance(error.reason, (ConnectionError, TimeoutError))
+    return isinstance(error, (ConnectionError, TimeoutError, HTTPException))
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        '''Create a ``TokenBucket`` that allows ``rate`` requests per second on average, and up to ``burst`` at once
+
+        Args:
+            ``rate`` (``float``): The number of tokens added per second
+
+            ``burst`` (``int``): The maximum number of tokens
+
+        Returns:
+            ``TokenBucket``: A ``TokenBucket`` object
+        '''
+        self.rate = rate; self.burst = burst; self.tokens = burst; self.time = perf_counter(); self.lock = Lock()
+
+    def acquire(self):
+        '''Take a token, waiting until one is available (tokens are reserved in order, so waiting callers are served first-come first-served)'''
+        with self.lock:
+            now = perf_counter(); self.tokens = min(self.burst, self.tokens + (now-self.time)*self.rate); self.time = now
+            self.tokens -= 1; wait = -self.tokens/self.rate
+        if wait > 0:
+            sleep(wait)
+
+class Scheduler:
+    def __init__(self, max_concurrency=1, min_concurrency=1, rate=None, burst=1, retries=5, backoff=0.25, max_backoff=60., latency_factor=3., metrics=None, seed=None):
+        '''Create a ``Scheduler`` that paces the downloads of a ``Fetcher``: per-host token-bucket rate limits, retries of transient errors with
+        exponential backoff (with full jitter), and an adaptive (AIMD) limit on concurrent downloads: the limit grows by one per round of successful
+        downloads, and is halved (at most once per round of downloads) when a download fails transiently or takes much longer than the fastest recent one
+
+        Args:
+            ``max_concurrency`` (``int``): The maximum (and initial) number of concurrent downloads
+
+            ``min_concurrency`` (``int``): The minimum number of concurrent downloads
+
+            ``rate`` (``float``): The maximum number of downloads started per second per host, or ``None`` for no limit
+
+            ``burst`` (``int``): The number of downloads that may be started at once per host (despite ``rate``)
+
+            ``retries`` (``int``): The maximum number of times a download is retried after a transient error
+
+            ``backoff`` (``float``): The maximum wait (in seconds) before the first retry, which doubles on each retry
+
+            ``max_backoff`` (``float``): The maximum wait (in seconds) before any retry
+
+            ``latency_factor`` (``float``): A download slower than ``latency_factor`` times the baseline latency signals congestion
+
+            ``metrics`` (``Metrics``): A ``Metrics`` object in which to count retries and concurrency changes, or ``None`` to not record
+
+            ``seed`` (``int``): The random seed of the jitter, or ``None`` for a random seed
+
+        Returns:
+            ``Scheduler``: A ``Scheduler`` object
+        '''
+        for name, value in [('max_concurrency', max_concurrency), ('min_concurrency', min_concurrency), ('retries', retries)]:
+            if not isinstance(value, int):
+                raise TypeError("'%s' must be an 'int', but you provided a '%s'" % (name, type(value).__name__))
+        if min_concurrency < 1 or max_concurrency < min_concurrency:
+            raise ValueError("Invalid concurrency range: [%d, %d]" % (min_concurrency, max_concurrency))
+        if rate is not None and rate <= 0:
+            raise ValueError("'rate' must be positive, but yours was %s" % rate)
+        self.max_concurrency = max_concurrency; self.min_concurrency = min_concurrency; self.rate = rate; self.burst = burst
+        self.retries = retries; self.backoff = backoff; self.max_backoff = max_backoff; self.latency_factor = latency_factor
+        self.metrics = NULL_METRICS if metrics is None else metrics; self.random = Random(seed)
+        self.limit = float(max_concurrency); self.in_flight = 0; self.cond = Condition(); self.buckets = dict()
+        self.baseline = None; self.since_decrease = 0 # baseline = latency of the fastest recent download; since_decrease = downloads finished since the last decrease
+
+    def acquire(self, host):
+        '''Wait until a download from ``host`` may start (a concurrency slot is free and ``host``'s rate limit allows it). Each ``acquire`` must be followed by a ``release``'''
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+            bucket = None
+            if self.rate is not None:
+                bucket = self.buckets.get(host, None)
+                if bucket is None:
+                    bucket = TokenBucket(self.rate, self.burst); self.buckets[host] = bucket
+        if bucket is not None:
+            bucket.acquire()
+
+    def release(self, host, seconds, error=None):
+        '''Free the concurrency slot of a download from ``host`` that took ``seconds`` (until its response arrived) and failed with ``error`` (or ``None`` if it succeeded),
+        and adapt the concurrency limit'''
+        with self.cond:
+            self.in_flight -= 1
+            if error is None:
+                self.baseline = seconds if self.baseline is None else min(seconds, 1.01*self.baseline) # drifts up slowly, so it follows a server that gets slower
+                congested = (seconds > self.latency_factor*self.baseline + LATENCY_SLACK)
+            else:
+                congested = is_transient(error)
+            self.since_decrease += 1
+            if congested:
+                if self.since_decrease > self.limit: # at most one decrease per window of downloads, as the other downloads in flight saw the same congestion
+                    self.limit = max(float(self.min_concurrency), self.limit/2); self.since_decrease = 0; self.metrics.count('concurrency_decreases')
+            elif error is None and self.limit < self.max_concurrency:
+                self.limit = min(float(self.max_concurrency), self.limit + 1/self.limit) # one more slot per round of successful downloads
+            self.cond.notify_all()
+
+    def retry(self, attempt, error):
+        '''Decide whether to retry a download whose ``attempt``-th retry (0 for the first try) failed with ``error``, and if so, wait before retrying
+
+        Returns:
+            ``bool``: ``True`` if the download should be retried (after this returns), otherwise ``False``
+        '''
+        if attempt >= self.retries or not is_transient(error):
+            return False
+        wait = self.random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        retry_after = error.headers.get('Retry-After', None) if isinstance(error, HTTPError) and error.headers is not None else None
+        if retry_after is not None and retry_after.strip().isdigit(): # the server said when to come back
+            wait = max(wait, min(self.max_backoff, float(retry_after)))
+        self.metrics.count('retries'); sleep(wait)
+        return True
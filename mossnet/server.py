@@ -0,0 +1,159 @@
+#! /usr/bin/env python
+from collections import OrderedDict
+from html import escape
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+from threading import Lock,Thread
+from urllib.parse import parse_qs,quote,urlsplit
+
+PAGE_SIZE = 100 # number of pairs per summary page
+CACHE_BYTES = 67108864 # maximum total size of the cached pair pages
+SUMMARY_HTML = '<html><head><title>MossNet</title></head><body><p>%d students, %d pairs, %d links. Page %d of %d. %s</p><table border="1"><tr><th>Links</th><th>Student 1</th><th>Student 2</th></tr>%s</table><p>%s</p></body></html>'
+ROW_HTML = '<tr><td>%d</td><td>%s</td><td><a href="/pair?u=%s&amp;v=%s">%s</a></td></tr>'
+
+class PageCache:
+    def __init__(self, max_bytes=CACHE_BYTES):
+        '''Create a thread-safe least-recently-used (LRU) cache of rendered pages, bounded by their total size
+
+        Args:
+            ``max_bytes`` (``int``): The maximum total size (in bytes) of the cached pages
+
+        Returns:
+            ``PageCache``: A ``PageCache`` object
+        '''
+        self.max_bytes = max_bytes; self.num_bytes = 0; self.pages = OrderedDict(); self.lock = Lock(); self.hits = 0; self.misses = 0
+
+    def get(self, key, render):
+        '''Return the cached page of ``key``, or render it with ``render()`` (outside the lock, so other pages are served meanwhile) and cache it
+
+        Args:
+            ``key`` (``tuple``): The key of the page
+
+            ``render`` (``function``): A function returning the page (as ``bytes``)
+
+        Returns:
+            ``bytes``: The page
+        '''
+        with self.lock:
+            page = self.pages.get(key, None)
+            if page is not None:
+                self.pages.move_to_end(key); self.hits += 1; return page
+            self.misses += 1
+        page = render()
+        if len(page) <= self.max_bytes:
+            with self.lock:
+                if key not in self.pages:
+                    self.pages[key] = page; self.num_bytes += len(page)
+                    while self.num_bytes > self.max_bytes:
+                        self.num_bytes -= len(self.pages.popitem(last=False)[1])
+        return page
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'; disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = urlsplit(self.path); query = {k:v[0] for k,v in parse_qs(parts.query).items()}
+        try:
+            if parts.path in {'/', '/summary'}:
+                page = self.server.summary_page(int(query.get('page', 1)))
+            elif parts.path == '/pair':
+                page = self.server.pair_page(query['u'], query['v'])
+            else:
+                self.send_error(404); return
+        except (KeyError, ValueError) as e: # missing/invalid parameters or nonexistent students
+            self.send_error(404, str(e)); return
+        self.send_response(200); self.send_header('Content-Type', 'text/html; charset=utf-8'); self.send_header('Content-Length', str(len(page))); self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+class MossNetServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, net, page_size=PAGE_SIZE, cache_bytes=CACHE_BYTES, verbose=False):
+        '''Create a read-only HTTP server of a ``MossNet``: a summary of its pairs (in descending order of number of links), paginated from the pair index,
+        and the ``get_pair(style='html')`` page of each pair, rendered on request and kept in an LRU cache. Only the pair order is computed up front
+
+        Args:
+            ``address`` (``tuple``): The ``(host, port)`` to listen on (port 0 picks a free port)
+
+            ``net`` (``MossNet``): The ``MossNet`` to serve (which mustn't be modified while it's served)
+
+            ``page_size`` (``int``): The number of pairs per summary page
+
+            ``cache_bytes`` (``int``): The maximum total size (in bytes) of the cached pair pages
+
+            ``verbose`` (``bool``): ``True`` to log every request, otherwise ``False``
+
+        Returns:
+            ``MossNetServer``: A ``MossNetServer`` object
+        '''
+        ThreadingHTTPServer.__init__(self, address, _Handler)
+        self.net = net; self.page_size = page_size; self.verbose = verbose; self.cache = PageCache(cache_bytes)
+        self.url = 'http://%s:%d' % self.server_address[:2]
+        t = net.table; self.order = t.sorted_pairs('descending') # computed up front, as is the pair index, so threads don't race to build them
+        if t.num_pairs() != 0:
+            t.find(*t.pair_labels(0))
+        self.download_lock = Lock() # building the pages of lazily-built pairs downloads HTML into the network, so only one is built at a time
+
+    def summary_page(self, page):
+        '''Return the HTML of page ``page`` (1-based) of the summary'''
+        t = self.net.table; nodes = t.nodes; num_pages = max(1, -(-len(self.order) // self.page_size))
+        if page < 1 or page > num_pages:
+            raise ValueError("Invalid page: %d" % page)
+        chunk = self.order[(page-1)*self.page_size:page*self.page_size]
+        rows = ''.join(ROW_HTML % (n, escape(nodes[u]), quote(nodes[u]), quote(nodes[v]), escape(nodes[v])) for n,u,v in zip(t.counts[chunk].tolist(), t.pair_u[chunk].tolist(), t.pair_v[chunk].tolist()))
+        nav = list()
+        if page > 1:
+            nav.append('<a href="/summary?page=%d">Previous</a>' % (page-1))
+        if page < num_pages:
+            nav.append('<a href="/summary?page=%d">Next</a>' % (page+1))
+        nav = ' '.join(nav)
+        return (SUMMARY_HTML % (len(nodes), t.num_pairs(), len(t.links), page, num_pages, nav, rows, nav)).encode()
+
+    def pair_page(self, u, v):
+        '''Return the HTML of the links between ``u`` and ``v`` (see ``MossNet.get_pair``), from the cache if it was rendered recently'''
+        if u not in self.net.table.node_index or v not in self.net.table.node_index or self.net.table.find(u, v) is None:
+            raise ValueError("Nonexistent pair: %s, %s" % (u, v))
+        return self.cache.get((u, v), lambda: self._render_pair(u, v))
+
+    def _render_pair(self, u, v):
+        with self.net.metrics.stage('render_pair'):
+            if len(self.net.table.urls) == 0: # every link's HTML was downloaded when building, so rendering only reads the network
+                return self.net.get_pair(u, v, style='html').encode()
+            with self.download_lock:
+                return self.net.get_pair(u, v, style='html').encode()
+
+def serve(net, host='127.0.0.1', port=8000, page_size=PAGE_SIZE, cache_bytes=CACHE_BYTES, verbose=False, block=True):
+    '''Serve a ``MossNet`` over HTTP (see ``MossNetServer``)
+
+    Args:
+        ``net`` (``MossNet``): The ``MossNet`` to serve
+
+        ``host`` (``str``): The host to listen on
+
+        ``port`` (``int``): The port to listen on (0 to pick a free port)
+
+        ``page_size`` (``int``): The number of pairs per summary page
+
+        ``cache_bytes`` (``int``): The maximum total size (in bytes) of the cached pair pages
+
+        ``verbose`` (``bool``): ``True`` to log every request, otherwise ``False``
+
+        ``block`` (``bool``): ``True`` to serve until interrupted, otherwise ``False`` to serve from a background thread
+
+    Returns:
+        ``MossNetServer``: The server (call ``shutdown()`` to stop it, if ``block`` is ``False``)
+    '''
+    server = MossNetServer((host, port), net, page_size=page_size, cache_bytes=cache_bytes, verbose=verbose)
+    if not block:
+        Thread(target=server.serve_forever, daemon=True).start(); return server
+    if verbose:
+        print("Serving MossNet at %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return server
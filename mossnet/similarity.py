@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+from mossnet.table import NO_ID
+from numpy import arange,array,concatenate,empty,flatnonzero,frombuffer,fromiter,full,int64,lexsort,load,minimum,repeat,savez,uint8,uint32,uint64,unique,zeros
+from numpy.random import default_rng
+from os import replace
+from re import compile as recompile
+from zlib import crc32
+
+TAG_RE = recompile(r'<[^>]*>'); TOKEN_RE = recompile(r'\w+')
+PRIME = 1099511628211 # FNV-1a prime, used to combine hashes (arithmetic wraps around modulo 2^64)
+BATCH_SHINGLES = 1048576 # number of shingles hashed per batch
+BLOCK_SHINGLES = 8192 # number of shingles hashed at a time within a batch (bounds the num_perm x BLOCK_SHINGLES hash matrix)
+EMPTY = 0xffffffff # signature of a snippet without any shingles
+
+class SnippetIndex:
+    def __init__(self, num_perm=128, bands=32, shingle_size=5, seed=0):
+        '''Create an empty ``SnippetIndex``: MinHash signatures of source code snippets (e.g. match HTML), keyed by content address,
+        with a banded locality-sensitive hashing (LSH) index to find near-duplicate snippets without comparing every pair
+
+        Args:
+            ``num_perm`` (``int``): The number of hash functions (i.e., the length of each signature)
+
+            ``bands`` (``int``): The number of LSH bands (must divide ``num_perm``). More bands find less similar pairs
+
+            ``shingle_size`` (``int``): The number of consecutive tokens per shingle
+
+            ``seed`` (``int``): The random seed of the hash functions
+
+        Returns:
+            ``SnippetIndex``: A ``SnippetIndex`` object
+        '''
+        if num_perm % bands != 0:
+            raise ValueError("'bands' (%d) must divide 'num_perm' (%d)" % (bands, num_perm))
+        self.num_perm = num_perm; self.bands = bands; self.shingle_size = shingle_size; self.seed = seed
+        rng = default_rng(seed); self.a = rng.integers(1, 2**63, num_perm, dtype=uint64) | uint64(1); self.b = rng.integers(0, 2**63, num_perm, dtype=uint64)
+        self.digests = list(); self.rows = dict() # key = digest; value = row of its signature
+        self.signatures = empty((0, num_perm), dtype=uint32)
+
+    def __len__(self):
+        return len(self.digests)
+
+    def _shingles(self, text, vocab):
+        '''Return the 32-bit shingle hashes of a snippet (its tokens, without HTML tags, in overlapping runs of ``shingle_size``),
+        hashing each distinct token once (``vocab`` maps tokens to their hashes)'''
+        tokens = TOKEN_RE.findall(TAG_RE.sub(' ', text))
+        for t in set(tokens).difference(vocab):
+            vocab[t] = crc32(t.encode())
+        tokens = fromiter(map(vocab.__getitem__, tokens), dtype=uint64, count=len(tokens))
+        k = min(self.shingle_size, len(tokens)); sh = zeros(len(tokens)-k+1 if k != 0 else 0, dtype=uint64)
+        for j in range(k): # polynomial hash of each window, computed for all windows at once
+            sh = sh*uint64(PRIME) + tokens[j:len(tokens)-k+1+j]
+        return unique((sh ^ (sh >> uint64(32))) & uint64(EMPTY))
+
+    def _signatures(self, shingles):
+        '''Return the MinHash signatures of snippets given as a list of shingle arrays, computed in one vectorized pass'''
+        sigs = full((len(shingles), self.num_perm), EMPTY, dtype=uint64); lengths = array([len(s) for s in shingles], dtype=int64)
+        if lengths.sum() == 0:
+            return sigs.astype(uint32)
+        x = concatenate(shingles); docs = repeat(arange(len(shingles)), lengths)
+        for start in range(0, len(x), BLOCK_SHINGLES):
+            block = x[start:start+BLOCK_SHINGLES]; block_docs = docs[start:start+BLOCK_SHINGLES]
+            h = (self.a[:,None]*block[None,:] + self.b[:,None]) >> uint64(32) # multiply-shift hashing (wraps around modulo 2^64)
+            seg = flatnonzero(concatenate(([True], block_docs[1:] != block_docs[:-1]))); seg_docs = block_docs[seg]
+            sigs[seg_docs] = minimum(sigs[seg_docs], minimum.reduceat(h, seg, axis=1).T)
+        return sigs.astype(uint32)
+
+    def update(self, blobs):
+        '''Compute the signatures of the strings of a ``BlobStore`` that aren't in this index yet (in batches)
+
+        Args:
+            ``blobs`` (``BlobStore``): The strings
+
+        Returns:
+            ``int``: The number of signatures computed
+        '''
+        new = [i for i in range(len(blobs)) if blobs.digest(i) not in self.rows]; batch = list(); batch_ids = list(); size = 0; sigs = [self.signatures]; vocab = dict()
+        for n,i in enumerate(new):
+            batch.append(self._shingles(blobs.get(i), vocab)); batch_ids.append(i); size += len(batch[-1])
+            if size >= BATCH_SHINGLES or n == len(new)-1:
+                sigs.append(self._signatures(batch))
+                for j in batch_ids:
+                    self.rows[blobs.digest(j)] = len(self.digests); self.digests.append(blobs.digest(j))
+                batch = list(); batch_ids = list(); size = 0
+        self.signatures = concatenate(sigs)
+        return len(new)
+
+    def candidates(self, rows=None, max_bucket=100):
+        '''Return the candidate near-duplicate pairs of rows: pairs whose signatures are identical in at least one band
+
+        Args:
+            ``rows`` (``ndarray``): The rows to consider, or ``None`` for all rows
+
+            ``max_bucket`` (``int``): Skip LSH buckets with more than this many rows (e.g. boilerplate shared by many snippets)
+
+        Returns:
+            ``ndarray``: The ``(i, j)`` rows (``i < j``) of each candidate pair (one pair per row)
+        '''
+        if rows is None:
+            rows = arange(len(self))
+        sigs = self.signatures[rows]; keep = (sigs != EMPTY).any(axis=1); rows = rows[keep]; sigs = sigs[keep].astype(uint64)
+        r = self.num_perm // self.bands; found = list()
+        for band in range(self.bands):
+            keys = zeros(len(rows), dtype=uint64)
+            for j in range(band*r, (band+1)*r):
+                keys = keys*uint64(PRIME) + sigs[:,j]
+            order = lexsort((rows, keys)); keys = keys[order]
+            starts = flatnonzero(concatenate(([True], keys[1:] != keys[:-1]))); sizes = concatenate((starts[1:], [len(keys)])) - starts
+            for start, size in zip(starts[(sizes > 1) & (sizes <= max_bucket)].tolist(), sizes[(sizes > 1) & (sizes <= max_bucket)].tolist()):
+                bucket = rows[order[start:start+size]]; i, j = (arange(size)[:,None] < arange(size)[None,:]).nonzero()
+                found.append(bucket[i]*len(self) + bucket[j])
+        if len(found) == 0:
+            return zeros((0, 2), dtype=int64)
+        codes = unique(concatenate(found)).astype(int64)
+        return concatenate(((codes // len(self))[:,None], (codes % len(self))[:,None]), axis=1)
+
+    def similarity(self, i, j):
+        '''Return the estimated Jaccard similarity of the snippets of rows ``i`` and ``j`` (which may be arrays of rows)'''
+        return (self.signatures[i] == self.signatures[j]).mean(axis=-1)
+
+    def save(self, path):
+        '''Save this ``SnippetIndex`` as an uncompressed NumPy ``.npz`` file
+
+        Args:
+            ``path`` (``str``): The desired output file's path
+        '''
+        tmp = '%s.tmp' % path; f = open(tmp, 'wb')
+        savez(f, params=array([self.num_perm, self.bands, self.shingle_size, self.seed], dtype=int64), digests=frombuffer(b''.join(self.digests), dtype=uint8), signatures=self.signatures)
+        f.close(); replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        '''Load a ``SnippetIndex`` saved by ``SnippetIndex.save``
+
+        Args:
+            ``path`` (``str``): The input file
+
+        Returns:
+            ``SnippetIndex``: The loaded ``SnippetIndex`` object
+        '''
+        data = load(path); num_perm, bands, shingle_size, seed = data['params'].tolist()
+        index = SnippetIndex(num_perm=num_perm, bands=bands, shingle_size=shingle_size, seed=seed); digests = data['digests'].tobytes()
+        index.digests = [digests[16*i:16*(i+1)] for i in range(len(digests)//16)]; index.rows = {d:i for i,d in enumerate(index.digests)}
+        index.signatures = data['signatures']
+        return index
+
+def similar_snippets(table, blobs, index, threshold=0.5, new_only=True, max_bucket=100):
+    '''Find pairs of students with near-duplicate snippets in a network (see ``MossNet.similar_snippets``)
+
+    Args:
+        ``table`` (``LinkTable``): The links
+
+        ``blobs`` (``BlobStore``): The match HTML of the links
+
+        ``index`` (``SnippetIndex``): A ``SnippetIndex`` holding the signatures of every string in ``blobs``
+
+        ``threshold`` (``float``): The minimum estimated Jaccard similarity of a pair
+
+        ``new_only`` (``bool``): ``True`` to omit pairs whose files were compared by MOSS (i.e., that are already linked), otherwise ``False``
+
+        ``max_bucket`` (``int``): See ``SnippetIndex.candidates``
+
+    Returns:
+        ``list`` of ``tuple``: The ``(similarity, u, u_filename, v, v_filename)`` of each pair, in decreasing order of similarity
+    '''
+    # owners of each snippet: the (student, file) of each side of each link
+    pair_of_link = repeat(arange(table.num_pairs()), table.counts)
+    owner_blobs = concatenate((table.links['u_blob'], table.links['v_blob'])).astype(int64)
+    owner_nodes = concatenate((table.pair_u[pair_of_link], table.pair_v[pair_of_link])).astype(int64)
+    owner_files = concatenate((table.links['u_file'], table.links['v_file'])).astype(int64)
+    has_blob = (owner_blobs != NO_ID)
+    owners = unique(concatenate((owner_blobs[has_blob][:,None], owner_nodes[has_blob][:,None], owner_files[has_blob][:,None]), axis=1), axis=0)
+    blob_rows = array([index.rows[blobs.digest(i)] for i in range(len(blobs))], dtype=int64)
+    rows = unique(blob_rows[owners[:,0]]) if len(owners) != 0 else zeros(0, dtype=int64)
+    by_row = dict() # key = row; value = list of (node, file) owners of snippets with that signature row
+    for blob, node, file in owners.tolist():
+        by_row.setdefault(int(blob_rows[blob]), list()).append((node, file))
+
+    # candidate snippet pairs (plus each snippet with itself, as identical snippets of different students share a row)
+    cand = index.candidates(rows, max_bucket=max_bucket)
+    sims = index.similarity(cand[:,0], cand[:,1]) if len(cand) != 0 else zeros(0)
+    hits = [(1., r, r) for r in rows.tolist() if len(by_row[r]) > 1] + [(s, i, j) for s, i, j in zip(sims.tolist(), cand[:,0].tolist(), cand[:,1].tolist()) if s >= threshold]
+    best = dict(); nodes = table.nodes; files = table.files
+    for s, i, j in hits:
+        for u, u_file in by_row[i]:
+            for v, v_file in by_row[j]:
+                if u == v:
+                    continue
+                key = (u, u_file, v, v_file) if nodes[u] < nodes[v] else (v, v_file, u, u_file)
+                if s > best.get(key, -1):
+                    best[key] = s
+    out = list()
+    for (u, u_file, v, v_file), s in best.items():
+        if new_only and table.find_link(nodes[u], nodes[v], files[u_file], files[v_file]) is not None:
+            continue
+        out.append((s, nodes[u], files[u_file], nodes[v], files[v_file]))
+    out.sort(key=lambda x: (-x[0], x[1:]))
+    return out
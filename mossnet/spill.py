@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+from mossnet.blobs import MappedBlobStore,digest
+from mossnet.metrics import NULL_METRICS
+from mossnet.MossNet import INDEXED_MAGIC,MossNet,_write_index
+from mossnet.table import LINK_DTYPE,NO_ID,_table_from_keys
+from array import array
+from numpy import empty,fromfile,int64
+from os import remove,replace
+from warnings import warn
+
+SPILL_MEMORY = 268435456 # default maximum size (in bytes) of the HTML and links held in memory before they're written to disk
+ROW_FIELDS = 10 # u, v, u_file, v_file, u_percent, v_percent, u_blob, v_blob, source, side
+
+class SpillStore:
+    def __init__(self, path, memory=SPILL_MEMORY, metrics=None):
+        '''Create an on-disk staging store of the links of a build, which become a ``MossNet`` saved in the indexed format at ``path``.
+        Each distinct HTML string is appended to the HTML section of the file and each link to a temporary file of link rows whenever
+        the strings and rows held in memory exceed ``memory`` bytes, so only the link labels and the digests of the HTML stay in memory
+
+        Args:
+            ``path`` (``str``): The path of the resulting indexed ``MossNet`` file (its HTML is memory-mapped from it)
+
+            ``memory`` (``int``): The maximum total size (in bytes) of the HTML and link rows held in memory before they're written to disk
+
+            ``metrics`` (``Metrics``): A ``Metrics`` object in which to record spills, or ``None`` to not record
+
+        Returns:
+            ``SpillStore``: A ``SpillStore`` object
+        '''
+        if not isinstance(memory, int):
+            raise TypeError("'memory' must be an 'int', but you provided a '%s'" % type(memory).__name__)
+        if memory < 0:
+            raise ValueError("'memory' must be non-negative, but yours was %d" % memory)
+        self.path = path; self.memory = memory; self.metrics = NULL_METRICS if metrics is None else metrics
+        self.html_file = open('%s.tmp' % path, 'wb'); self.html_file.write(INDEXED_MAGIC); self.rows_file = open('%s.links.tmp' % path, 'wb')
+        self.html = list(); self.rows = array('q'); self.num_bytes = 0 # HTML and link rows not yet written
+        self.offsets = array('Q', [0]); self.digests = list(); self.index = dict() # key = digest; value = blob ID
+        self.node_index = dict(); self.file_index = dict(); self.url_index = dict(); self.num_links = 0
+
+    def _intern(self, index, label):
+        '''Return the ID of ``label`` in ``index`` (a ``dict`` of labels to IDs), adding it if it's new'''
+        i = index.get(label, None)
+        if i is None:
+            i = len(index); index[label] = i
+        return i
+
+    def add_html(self, text):
+        '''Add an HTML string (if an identical string isn't already in this store)
+
+        Args:
+            ``text`` (``str``): The string, or ``None`` (e.g. HTML that hasn't been downloaded yet)
+
+        Returns:
+            ``int``: The blob ID of ``text``, or ``NO_ID`` if ``text`` is ``None``
+        '''
+        if text is None:
+            return NO_ID
+        key = digest(text); blob_id = self.index.get(key, None)
+        if blob_id is None:
+            data = text.encode(); blob_id = len(self.digests); self.index[key] = blob_id; self.digests.append(key)
+            self.html.append(data); self.offsets.append(self.offsets[-1] + len(data)); self.num_bytes += len(data)
+            if self.num_bytes > self.memory:
+                self.flush()
+        return blob_id
+
+    def add(self, u, v, u_file, v_file, u_percent, u_html, v_percent, v_html, source=None):
+        '''Add a link (a later link between the same students and files replaces it)
+
+        Args:
+            ``u`` (``str``): The first student
+
+            ``v`` (``str``): The second student
+
+            ``u_file`` (``str``): The filename of ``u``
+
+            ``v_file`` (``str``): The filename of ``v``
+
+            ``u_percent`` (``int``): The percent similarity of ``u``'s file
+
+            ``u_html`` (``str``): The HTML of ``u``'s file, or ``None`` if it wasn't downloaded
+
+            ``v_percent`` (``int``): The percent similarity of ``v``'s file
+
+            ``v_html`` (``str``): The HTML of ``v``'s file, or ``None`` if it wasn't downloaded
+
+            ``source`` (``tuple``): The ``(moss_url, side)`` of a lazily-built link (``side`` is the side of ``u`` in the match), or ``None``
+        '''
+        if u == v:
+            return
+        if v < u:
+            u, v, u_file, v_file, u_percent, u_html, v_percent, v_html = v, u, v_file, u_file, v_percent, v_html, u_percent, u_html
+            if source is not None:
+                source = (source[0], 1-source[1])
+        if source is None:
+            source_id = NO_ID; side = 0
+        else:
+            source_id = self._intern(self.url_index, source[0]); side = source[1]
+        u_blob = self.add_html(u_html); v_blob = self.add_html(v_html) # may flush, so before the row is added
+        self.rows.extend((self._intern(self.node_index, u), self._intern(self.node_index, v), self._intern(self.file_index, u_file), self._intern(self.file_index, v_file),
+                          u_percent, v_percent, u_blob, v_blob, source_id, side))
+        self.num_links += 1; self.num_bytes += 8*ROW_FIELDS
+        if self.num_bytes > self.memory:
+            self.flush()
+
+    def flush(self):
+        '''Write the HTML and link rows held in memory to disk'''
+        if self.num_bytes == 0:
+            return
+        with self.metrics.stage('spill') as stage:
+            stage.items = self.num_bytes
+            self.html_file.write(b''.join(self.html)); self.rows_file.write(self.rows.tobytes())
+            self.html = list(); self.rows = array('q'); self.num_bytes = 0
+
+    def close(self, fetcher=None):
+        '''Finish the ``MossNet`` file: sort the links (keeping the latest of any duplicates), write its index after the HTML, and open it
+
+        Args:
+            ``fetcher`` (``Fetcher``): The ``Fetcher`` used to download match HTML that wasn't downloaded when building (see ``build(lazy=True)``)
+
+        Returns:
+            ``MossNet``: The resulting ``MossNet`` object (whose HTML is memory-mapped from ``path``)
+        '''
+        self.flush(); self.rows_file.close()
+        rows = fromfile(self.rows_file.name, dtype=int64).reshape(self.num_links, ROW_FIELDS); remove(self.rows_file.name)
+        links = empty(self.num_links, dtype=LINK_DTYPE)
+        for j,field in enumerate(['u_file', 'v_file', 'u_percent', 'v_percent', 'u_blob', 'v_blob', 'source', 'side']):
+            links[field] = rows[:,j+2]
+        table, num_duplicates = _table_from_keys(list(self.node_index), list(self.file_index), list(self.url_index), rows[:,:4], links); del rows, links
+        if num_duplicates != 0:
+            warn("%d links found multiple times. Taking latest version" % num_duplicates)
+        digests = b''.join(self.digests); self.index = None; self.digests = None
+        _write_index(self.html_file, table, [(len(INDEXED_MAGIC), self.offsets)], digests); self.html_file.close(); replace(self.html_file.name, self.path)
+        return MossNet(table, fetcher=fetcher, blobs=MappedBlobStore(self.path, [(len(INDEXED_MAGIC), self.offsets)], digests), metrics=self.metrics)
+
+    def abort(self):
+        '''Close and delete the staging files (e.g. if the build failed) without writing the ``MossNet`` file'''
+        for f in [self.html_file, self.rows_file]:
+            f.close()
+            try:
+                remove(f.name)
+            except FileNotFoundError: # already finished by close
+                pass
@@ -0,0 +1,272 @@
+#! /usr/bin/env python
+from numpy import arange,argpartition,argsort,array,bincount,concatenate,diff,dtype,empty,flatnonzero,float64,int32,int64,lexsort,repeat,unique,zeros
+
+NO_ID = -1 # blob/source ID of HTML that hasn't been downloaded / a link built from a downloaded match
+NODE_STATS_DTYPE = dtype([('degree','<i8'), ('links','<i8'), ('max_percent','<i2'), ('mean_percent','<f8'), ('files','<i8')])
+LINK_DTYPE = dtype([('u_file','<i4'), ('v_file','<i4'), ('u_percent','<i2'), ('v_percent','<i2'), ('u_blob','<i8'), ('v_blob','<i8'), ('source','<i4'), ('side','<i1')])
+
+class LinkTable:
+    def __init__(self, nodes, files, urls, pair_u, pair_v, offsets, links):
+        '''Create a ``LinkTable``: the links of a ``MossNet``, stored once per (undirected) link in integer-indexed arrays.
+        Pairs are oriented so that the label of ``u`` is less than the label of ``v``, and are sorted by ``(u, v)`` node ID.
+        The links of pair ``i`` are ``links[offsets[i]:offsets[i+1]]``.
+
+        Args:
+            ``nodes`` (``list``): The node labels (in order of their IDs)
+
+            ``files`` (``list``): The filenames (in order of their IDs)
+
+            ``urls`` (``list``): The MOSS match URLs of lazily-built links (in order of their IDs)
+
+            ``pair_u`` (``ndarray``): The node ID of ``u`` of each pair
+
+            ``pair_v`` (``ndarray``): The node ID of ``v`` of each pair
+
+            ``offsets`` (``ndarray``): The index of the first link of each pair, plus the total number of links
+
+            ``links`` (``ndarray``): The links (of dtype ``LINK_DTYPE``), where ``side`` is the side (0 = left, 1 = right) of ``u`` in the match at URL ``source``
+
+        Returns:
+            ``LinkTable``: A ``LinkTable`` object
+        '''
+        self.nodes = nodes; self.files = files; self.urls = urls
+        self.pair_u = pair_u; self.pair_v = pair_v; self.offsets = offsets; self.links = links
+        self.node_index = {u:i for i,u in enumerate(nodes)}
+        self.counts = diff(self.offsets); self._pair_index = None; self._file_index = None; self._sorted = dict(); self._histogram = None; self._node_stats = None
+
+    def num_pairs(self):
+        '''Return the number of pairs with at least one link'''
+        return len(self.pair_u)
+
+    def find(self, u, v):
+        '''Return the index of the pair of nodes ``u`` and ``v`` (in either order), or ``None`` if they have no links'''
+        if u not in self.node_index or v not in self.node_index:
+            return None
+        if v < u:
+            u, v = v, u
+        if self._pair_index is None: # only built once a pair is looked up
+            self._pair_index = dict(zip(zip(self.pair_u.tolist(), self.pair_v.tolist()), range(len(self.pair_u))))
+        return self._pair_index.get((self.node_index[u], self.node_index[v]), None)
+
+    def find_link(self, u, v, u_file, v_file):
+        '''Return the index (in ``links``) of the link between file ``u_file`` of ``u`` and file ``v_file`` of ``v``, or ``None`` if there is no such link'''
+        i = self.find(u, v)
+        if i is None:
+            return None
+        if v < u:
+            u_file, v_file = v_file, u_file
+        if self._file_index is None:
+            self._file_index = {f:j for j,f in enumerate(self.files)}
+        if u_file not in self._file_index or v_file not in self._file_index:
+            return None
+        links = self.links[self.offsets[i]:self.offsets[i+1]]
+        hits = flatnonzero((links['u_file'] == self._file_index[u_file]) & (links['v_file'] == self._file_index[v_file]))
+        return None if len(hits) == 0 else int(self.offsets[i] + hits[0])
+
+    def sorted_pairs(self, order='descending'):
+        '''Return the pair indices in ``"ascending"`` or ``"descending"`` order of number of links (ties keep pair order).
+        The table is immutable, so each order is computed once and cached'''
+        if order not in self._sorted:
+            if order == 'ascending':
+                self._sorted[order] = argsort(self.counts, kind='stable')
+            elif order == 'descending':
+                self._sorted[order] = argsort(-self.counts, kind='stable')
+            else:
+                raise ValueError("Invalid order: %s" % order)
+        return self._sorted[order]
+
+    def histogram(self):
+        '''Return the (cached) histogram of number of links per pair, where ``histogram()[n]`` is the number of pairs with ``n`` links'''
+        if self._histogram is None:
+            self._histogram = bincount(self.counts)
+        return self._histogram
+
+    def node_stats(self):
+        '''Return the (cached) statistics of each node (in order of node ID), computed in one vectorized pass over the links (of dtype ``NODE_STATS_DTYPE``):
+        ``degree`` (number of other nodes it's linked to), ``links`` (number of links), ``max_percent`` and ``mean_percent`` (of its own files' percents
+        over its links, 0 if it has none), and ``files`` (number of distinct filenames of its files in its links)'''
+        if self._node_stats is None:
+            n = len(self.nodes); stats = zeros(n, dtype=NODE_STATS_DTYPE)
+            stats['degree'] = bincount(self.pair_u, minlength=n) + bincount(self.pair_v, minlength=n)
+            if len(self.links) != 0:
+                # each link counts once for u (with u's file and percent) and once for v
+                owners = concatenate((repeat(self.pair_u, self.counts), repeat(self.pair_v, self.counts))).astype(int64)
+                percents = concatenate((self.links['u_percent'], self.links['v_percent'])); files = concatenate((self.links['u_file'], self.links['v_file'])).astype(int64)
+                num_links = bincount(owners, minlength=n); stats['links'] = num_links
+                has_links = (num_links != 0); stats['mean_percent'][has_links] = bincount(owners, weights=percents.astype(float64), minlength=n)[has_links] / num_links[has_links]
+                order = lexsort((percents, owners)); last = flatnonzero(concatenate((owners[order][1:] != owners[order][:-1], [True])))
+                stats['max_percent'][owners[order[last]]] = percents[order[last]]
+                stats['files'] = bincount(unique(owners*len(self.files) + files) // len(self.files), minlength=n)
+            self._node_stats = stats
+        return self._node_stats
+
+    def pair_labels(self, i):
+        '''Return the ``(u, v)`` node labels of pair ``i``'''
+        return self.nodes[self.pair_u[i]], self.nodes[self.pair_v[i]]
+
+    def records(self):
+        '''Iterate over the links as ``(u, v, u_file, v_file, u_percent, u_blob, v_percent, v_blob, source)`` tuples (see ``table_from_records``)'''
+        nodes = self.nodes; files = self.files; urls = self.urls
+        for i in range(len(self.pair_u)):
+            u = nodes[self.pair_u[i]]; v = nodes[self.pair_v[i]]
+            for l in self.links[self.offsets[i]:self.offsets[i+1]].tolist():
+                u_file, v_file, u_percent, v_percent, u_blob, v_blob, source, side = l
+                if source == NO_ID:
+                    source = None
+                else:
+                    source = (urls[source], side)
+                yield (u, v, files[u_file], files[v_file], u_percent, (None if u_blob == NO_ID else u_blob), v_percent, (None if v_blob == NO_ID else v_blob), source)
+
+def top_indices(values, k):
+    '''Return the indices of the ``k`` largest of ``values`` in descending order (ties in index order, as a stable sort would give),
+    selecting them in linear time and sorting only the selected ones
+
+    Args:
+        ``values`` (``ndarray``): The values
+
+        ``k`` (``int``): The number of indices
+
+    Returns:
+        ``ndarray``: The indices
+    '''
+    if k >= len(values):
+        return argsort(-values, kind='stable')
+    if k <= 0:
+        return zeros(0, dtype=int64)
+    kth = values[argpartition(-values, k-1)[k-1]] # the k-th largest value
+    above = flatnonzero(values > kth); ties = flatnonzero(values == kth)[:k-len(above)]
+    selected = concatenate((above, ties))
+    return selected[lexsort((selected, -values[selected]))]
+
+def table_from_records(records, nodes=()):
+    '''Create a ``LinkTable`` from link records. If multiple records describe the same link, the latest one is kept.
+
+    Args:
+        ``records`` (iterable): ``(u, v, u_file, v_file, u_percent, u_blob, v_percent, v_blob, source)`` tuples, where ``u_blob``/``v_blob`` are blob IDs (or ``None``) and ``source`` is ``None`` or the ``(moss_url, side)`` of a lazily-built link (``side`` is the side of ``u`` in the match)
+
+        ``nodes`` (iterable): Node labels to include even if they have no links
+
+    Returns:
+        ``LinkTable``: The resulting ``LinkTable`` object
+    '''
+    node_index = dict(); file_index = dict(); url_index = dict(); latest = dict()
+    for u in nodes:
+        if u not in node_index:
+            node_index[u] = len(node_index)
+    for u, v, u_file, v_file, u_percent, u_blob, v_percent, v_blob, source in records:
+        if u == v:
+            continue
+        if v < u:
+            u, v, u_file, v_file, u_percent, u_blob, v_percent, v_blob = v, u, v_file, u_file, v_percent, v_blob, u_percent, u_blob
+            if source is not None:
+                source = (source[0], 1-source[1])
+        for x in [u, v]:
+            if x not in node_index:
+                node_index[x] = len(node_index)
+        for x in [u_file, v_file]:
+            if x not in file_index:
+                file_index[x] = len(file_index)
+        if source is None:
+            source_id = NO_ID; side = 0
+        else:
+            if source[0] not in url_index:
+                url_index[source[0]] = len(url_index)
+            source_id = url_index[source[0]]; side = source[1]
+        latest[(node_index[u], node_index[v], file_index[u_file], file_index[v_file])] = (u_percent, v_percent, (NO_ID if u_blob is None else u_blob), (NO_ID if v_blob is None else v_blob), source_id, side)
+    keys = array(list(latest.keys()), dtype=int64).reshape(len(latest), 4)
+    links = empty(len(latest), dtype=LINK_DTYPE)
+    if len(latest) != 0:
+        values = array(list(latest.values()), dtype=int64)
+        links['u_file'] = keys[:,2]; links['v_file'] = keys[:,3]
+        for j,field in enumerate(['u_percent', 'v_percent', 'u_blob', 'v_blob', 'source', 'side']):
+            links[field] = values[:,j]
+    return _table_from_keys(list(node_index), list(file_index), list(url_index), keys, links)[0]
+
+def table_from_dict(moss_results_dict, intern=None):
+    '''Create a ``LinkTable`` from a symmetric 3D dictionary of MOSS results that's trusted to be well-formed (e.g. built by ``build`` or saved by ``MossNet.save``),
+    which is much faster than ``table_from_records``: each link is read once (from the side of the student with the lesser label), nothing is validated,
+    and the arrays are filled in bulk
+
+    Args:
+        ``moss_results_dict`` (``dict``): A 3D dictionary of MOSS results, in which every student is a key and every link is in both directions
+
+        ``intern`` (``function``): A function returning the blob ID of an HTML string (e.g. ``BlobStore.add``), or ``None`` if the HTML is given as blob IDs
+
+    Returns:
+        ``LinkTable``: The resulting ``LinkTable`` object
+    '''
+    node_index = {u:i for i,u in enumerate(moss_results_dict)}; file_index = dict(); url_index = dict(); rows = list()
+    for u, u_edges in moss_results_dict.items():
+        ui = node_index[u]
+        for v, u_v_links in u_edges.items():
+            if not u < v:
+                continue
+            vi = node_index[v]
+            for (u_fn, v_fn), link in u_v_links.items():
+                fi = file_index.get(u_fn, None)
+                if fi is None:
+                    fi = len(file_index); file_index[u_fn] = fi
+                gi = file_index.get(v_fn, None)
+                if gi is None:
+                    gi = len(file_index); file_index[v_fn] = gi
+                left = link[0]; right = link[1]; u_blob = left[1]; v_blob = right[1]
+                if intern is not None:
+                    u_blob = intern(u_blob); v_blob = intern(v_blob)
+                if len(link) == 2:
+                    source_id = NO_ID; side = 0
+                else:
+                    source_id = url_index.get(link[2][0], None); side = link[2][1]
+                    if source_id is None:
+                        source_id = len(url_index); url_index[link[2][0]] = source_id
+                rows.append((ui, vi, fi, gi, left[0], right[0], (NO_ID if u_blob is None else u_blob), (NO_ID if v_blob is None else v_blob), source_id, side))
+    rows = array(rows, dtype=int64).reshape(len(rows), 10); links = empty(len(rows), dtype=LINK_DTYPE)
+    for j,field in enumerate(['u_file', 'v_file', 'u_percent', 'v_percent', 'u_blob', 'v_blob', 'source', 'side']):
+        links[field] = rows[:,j+2]
+    return _table_from_keys(list(node_index), list(file_index), list(url_index), rows[:,:4], links)[0]
+
+def _table_from_keys(nodes, files, urls, keys, links):
+    '''Create a ``LinkTable`` from links whose ``(u, v, u_file, v_file)`` IDs are the rows of ``keys``, keeping the last of any duplicate links
+
+    Returns:
+        ``tuple``: The ``LinkTable``, and the number of duplicate links that were dropped
+    '''
+    order = lexsort((arange(len(keys)), keys[:,3], keys[:,2], keys[:,1], keys[:,0])); keys = keys[order]; links = links[order]
+    if len(keys) != 0:
+        last = concatenate(((keys[1:] != keys[:-1]).any(axis=1), [True])) # last (i.e., latest) of each run of identical keys
+        num_duplicates = len(keys) - int(last.sum()); keys = keys[last]; links = links[last]
+        starts = flatnonzero(concatenate(([True], (keys[1:,0] != keys[:-1,0]) | (keys[1:,1] != keys[:-1,1]))))
+    else:
+        num_duplicates = 0; starts = zeros(0, dtype=int64)
+    offsets = concatenate((starts, [len(keys)])).astype(int64)
+    return LinkTable(nodes, files, urls, keys[starts,0].astype(int32), keys[starts,1].astype(int32), offsets, links), num_duplicates
+
+def merge_tables(tables, blob_maps):
+    '''Merge ``LinkTable`` objects in a single vectorized pass. If multiple tables have the same link, the one from the latest table is kept.
+
+    Args:
+        ``tables`` (``list``): The ``LinkTable`` objects
+
+        ``blob_maps`` (``list``): For each table, an ``ndarray`` mapping its blob IDs to blob IDs in the merged network's ``BlobStore``
+
+    Returns:
+        ``tuple``: The merged ``LinkTable``, and the number of duplicate links that were dropped
+    '''
+    nodes = dict(); files = dict(); urls = dict(); all_keys = list(); all_links = list()
+    for t, blob_map in zip(tables, blob_maps):
+        maps = list()
+        for labels, index in [(t.nodes, nodes), (t.files, files), (t.urls, urls)]:
+            for x in labels:
+                if x not in index:
+                    index[x] = len(index)
+            maps.append(array([index[x] for x in labels], dtype=int64))
+        node_map, file_map, url_map = maps
+        keys = empty((len(t.links), 4), dtype=int64); links = t.links.copy()
+        keys[:,0] = repeat(node_map[t.pair_u], t.counts); keys[:,1] = repeat(node_map[t.pair_v], t.counts)
+        keys[:,2] = file_map[t.links['u_file']]; keys[:,3] = file_map[t.links['v_file']]
+        links['u_file'] = keys[:,2]; links['v_file'] = keys[:,3]
+        for field, id_map in [('u_blob', blob_map), ('v_blob', blob_map), ('source', url_map)]:
+            ids = links[field]; has_id = (ids != NO_ID); ids[has_id] = id_map[ids[has_id]]
+        all_keys.append(keys); all_links.append(links)
+    if len(all_keys) == 0:
+        return _table_from_keys(list(), list(), list(), zeros((0,4), dtype=int64), empty(0, dtype=LINK_DTYPE))
+    return _table_from_keys(list(nodes), list(files), list(urls), concatenate(all_keys), concatenate(all_links))
@@ -45,9 +45,9 @@ setup(
     keywords='education moss plagiarism coding programming',  # Optional
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),  # Required
     install_requires=[
-        'bs4',
-        'lxml',
         'networkx',
+        'numpy',
+        'scipy',
     ],
     extras_require={  # Optional
         'dev': ['check-manifest'],